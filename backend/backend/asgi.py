@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+from recipes.throttling import EarlyRefusalApplication  # noqa: E402  (needs the app registry)
+
+# Answers retries from throttled clients without handing them to Django.
+application = EarlyRefusalApplication(application)
@@ -13,6 +13,10 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
+from .database import database_from_env, replicas_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -53,6 +57,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware too.
+    'recipes.middleware.instrumentation_middleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -61,6 +67,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Keeps a request's reads on the primary once it writes (see recipes/routers.py).
+    'recipes.middleware.replica_routing_middleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -86,12 +94,52 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+#
+# Configured from the environment (see backend/database.py): SQLite in WAL mode with a busy
+# timeout by default, PostgreSQL when DATABASE_URL points at one. Connections are reused for
+# DB_CONN_MAX_AGE seconds; on PostgreSQL, DB_POOL_MAX_SIZE switches to a connection pool.
+#
+# DATABASE_REPLICA_URLS adds read replicas. Reads are spread over them, except in a request
+# that writes and for RECIPES_REPLICA_LAG seconds after a restaurant's last write (see
+# recipes/routers.py). The window is tracked in the 'recipes' cache, so with several workers
+# it needs RECIPES_CACHE_URL to be shared.
+
+_replicas = replicas_from_env(BASE_DIR)
 
 DATABASES = {
+    'default': database_from_env(BASE_DIR),
+    **_replicas,
+}
+DATABASE_REPLICAS = list(_replicas)
+DATABASE_ROUTERS = ['recipes.routers.PrimaryReplicaRouter']
+RECIPES_REPLICA_LAG = float(os.getenv('RECIPES_REPLICA_LAG', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+#
+# 'recipes' holds cached recipe list/detail responses. In-process LocMem by default, bounded to
+# RECIPES_CACHE_MAX_ENTRIES (least recently used entries are culled first). Set RECIPES_CACHE_URL
+# (e.g. redis://127.0.0.1:6379/1) to share it between workers; give that Redis a maxmemory with
+# an allkeys-lru policy to keep it bounded.
+
+RECIPES_CACHE_URL = os.getenv('RECIPES_CACHE_URL')
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 300))
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipes': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': RECIPES_CACHE_URL,
+    } if RECIPES_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipes',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RECIPES_CACHE_MAX_ENTRIES', 5000)),
+        },
+    },
 }
 
 
@@ -126,8 +174,79 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Simple JWT, but loads the user and their restaurant profile in one query.
+        'recipes.authentication.RestaurantJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        # Same bytes as JSONRenderer, encoded with orjson when it is installed, and timed
+        # in the 'render' phase of Server-Timing.
+        'recipes.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        # Token buckets per restaurant and scope; see RECIPES_THROTTLE_RATES.
+        'recipes.throttling.RestaurantRateThrottle',
+    ),
+}
+
+# Read fast path: recipe list and detail responses are built from values_list() rows instead
+# of model instances and serializers (recipes/fastpath.py), and JSON is encoded with orjson when
+# it is installed (recipes/renderers.py). Both produce the same bytes; these switch them off.
+RECIPES_FAST_READS = os.getenv('RECIPES_FAST_READS', '1') not in ('0', 'false', 'False')
+RECIPES_ORJSON = os.getenv('RECIPES_ORJSON', '1') not in ('0', 'false', 'False')
+
+# Request instrumentation (recipes/instrumentation.py). Requests slower than
+# RECIPES_SLOW_REQUEST_MS are logged with their SQL to the 'recipes.slow' logger (0 disables).
+# /metrics is open to admins, and to scrapers sending "Authorization: Bearer <RECIPES_METRICS_TOKEN>".
+RECIPES_SERVER_TIMING = os.getenv('RECIPES_SERVER_TIMING', '1') not in ('0', 'false', 'False')
+RECIPES_SLOW_REQUEST_MS = int(os.getenv('RECIPES_SLOW_REQUEST_MS', 500))
+RECIPES_METRICS_TOKEN = os.getenv('RECIPES_METRICS_TOKEN', '')
+
+# Seconds an authenticated user (with profile) may be reused from an in-process cache
+# instead of being loaded per request. 0 disables it; keep it short, since deactivating a
+# user or moving them to another restaurant only takes effect everywhere after this long.
+RECIPES_AUTH_CACHE_TTL = int(os.getenv('RECIPES_AUTH_CACHE_TTL', 0))
+
+# Ingredient autocomplete is served from a per-process index (recipes/autocomplete.py). Names
+# written by this process show up at once; the index is rebuilt after this many seconds to pick
+# up names written by other processes.
+RECIPES_AUTOCOMPLETE_TTL = int(os.getenv('RECIPES_AUTOCOMPLETE_TTL', 300))
+
+# Server-sent recipe events (recipes/events.py), served under ASGI. With several worker
+# processes set RECIPES_EVENTS_BACKEND=recipes.events.RedisBackend so every worker sees every
+# write; it uses RECIPES_EVENTS_REDIS_URL, or the cache's Redis. A stream that falls
+# RECIPES_EVENTS_QUEUE_SIZE events behind is told to resync and closed; one without events is
+# closed after RECIPES_EVENTS_IDLE_TIMEOUT seconds, with a keepalive comment every
+# RECIPES_EVENTS_HEARTBEAT seconds until then. A restaurant may hold at most
+# RECIPES_EVENTS_MAX_CONNECTIONS streams per process. Browsers open a stream with a ticket from
+# POST /api/recipes/events/ticket/, valid for RECIPES_EVENTS_TICKET_TTL seconds.
+RECIPES_EVENTS_BACKEND = os.getenv('RECIPES_EVENTS_BACKEND', 'recipes.events.LocalBackend')
+RECIPES_EVENTS_REDIS_URL = os.getenv('RECIPES_EVENTS_REDIS_URL', RECIPES_CACHE_URL or '')
+RECIPES_EVENTS_QUEUE_SIZE = int(os.getenv('RECIPES_EVENTS_QUEUE_SIZE', 100))
+RECIPES_EVENTS_IDLE_TIMEOUT = float(os.getenv('RECIPES_EVENTS_IDLE_TIMEOUT', 300))
+RECIPES_EVENTS_HEARTBEAT = float(os.getenv('RECIPES_EVENTS_HEARTBEAT', 15))
+RECIPES_EVENTS_MAX_CONNECTIONS = int(os.getenv('RECIPES_EVENTS_MAX_CONNECTIONS', 100))
+RECIPES_EVENTS_TICKET_TTL = int(os.getenv('RECIPES_EVENTS_TICKET_TTL', 30))
+
+# Request budgets per restaurant (recipes/throttling.py), as "<requests>/<s|min|hour|day>":
+# searches, other reads, and writes each have their own. Bursts of up to a full budget are
+# allowed; beyond that requests get a 429 with Retry-After. An empty value turns a scope's
+# throttling off. The search budget is shared by all of a restaurant's cooks, and search-as-
+# you-type sends a request every few keystrokes, so it leaves room for several at once.
+RECIPES_THROTTLE_RATES = {
+    'read': os.getenv('RECIPES_THROTTLE_READ', '1200/min'),
+    'search': os.getenv('RECIPES_THROTTLE_SEARCH', '600/min'),
+    'write': os.getenv('RECIPES_THROTTLE_WRITE', '300/min'),
 }
 
-CORS_ALLOWED_ORIGINS = TRUSTED_ORIGINS
\ No newline at end of file
+# Background jobs (recipes/jobs.py), run by `manage.py run_workers`. A running job whose worker
+# has not renewed its lease for RECIPES_JOBS_LEASE seconds is given to another worker; keep it
+# well above the poll interval. A failed job is retried after RECIPES_JOBS_RETRY_DELAY seconds,
+# doubled for every further attempt.
+RECIPES_JOBS_LEASE = int(os.getenv('RECIPES_JOBS_LEASE', 300))
+RECIPES_JOBS_RETRY_DELAY = int(os.getenv('RECIPES_JOBS_RETRY_DELAY', 30))
+
+CORS_ALLOWED_ORIGINS = TRUSTED_ORIGINS
+# Let the frontend send conditional requests and read the validators back.
+CORS_ALLOW_HEADERS = (*default_headers, 'if-match', 'if-none-match')
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified', 'X-Cache', 'Server-Timing', 'Retry-After', 'Location']
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Restaurant, UserProfile, Ingredient, Recipe, RecipeIngredient
+from .models import Job, Restaurant, UserProfile, Ingredient, Recipe, RecipeIngredient
+from .signals import batched_recipe_changes
 
 # This allows managing models from the Django admin interface.
 admin.site.register(Restaurant)
@@ -13,5 +14,17 @@ class RecipeIngredientInline(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientInline,)
-    list_display = ('title', 'restaurant', 'updated_at')
-    list_filter = ('restaurant',)
\ No newline at end of file
+    list_display = ('title', 'restaurant', 'ingredient_count', 'updated_at')
+    list_filter = ('restaurant',)
+
+    def save_related(self, request, form, formsets, change):
+        # One summary refresh, reindex and cache invalidation for the whole inline formset,
+        # still inside the admin's transaction.
+        with batched_recipe_changes():
+            super().save_related(request, form, formsets, change)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'restaurant_id', 'progress', 'total', 'attempts', 'created_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('worker', 'heartbeat_at', 'started_at', 'finished_at')
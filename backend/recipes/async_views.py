@@ -0,0 +1,225 @@
+from django.core import signing
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from . import cache, conditional, events, fastpath, routers
+from .authentication import RestaurantJWTAuthentication, get_restaurant_id
+from .models import Recipe
+from .pagination import RecipeCursorPagination
+from .renderers import FastJSONRenderer
+from .search import RecipeSearchFilter
+from .serializers import RecipeDetailSerializer, RecipeListSerializer, ingredient_lines_prefetch
+from .throttling import RestaurantRateThrottle
+
+# Async read endpoints for recipes: list (with search and pagination) and retrieve.
+#
+# RecipeViewSet is synchronous, so under ASGI every request holds a thread for its whole
+# duration. These views run on the event loop and only leave it for the awaited ORM calls
+# (aget, aiterator, aaggregate). They reuse the viewset's authentication, throttling, tenant
+# filtering, search, pagination, sparse fieldsets, serializers, conditional requests and
+# response cache, and return byte-for-byte the same payloads, so a client can switch between
+# the two freely.
+
+
+class AsyncRecipeView(View):
+    http_method_names = ['get', 'head', 'options']
+    action = None
+    fields = None  # Sparse fieldset (?fields=, ?expand=), as on RecipeViewSet.
+
+    async def dispatch(self, request, *args, **kwargs):
+        # A bare DRF Request, for query_params and the paginator; authentication is done
+        # here with the async authenticator rather than by the Request itself.
+        request = Request(request, authenticators=())
+        self.authenticator = RestaurantJWTAuthentication()
+        try:
+            await self.authenticate(request)
+            await self.check_throttles(request)
+            await routers.apin_after_recent_write(get_restaurant_id(request))
+            response = await super().dispatch(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(request, exc)
+        return self.finalize_response(response)
+
+    async def authenticate(self, request):
+        result = await self.authenticator.aauthenticate(request)
+        if result is None:
+            raise exceptions.NotAuthenticated()
+        request.user, request.auth = result
+
+    async def check_throttles(self, request):
+        throttle = RestaurantRateThrottle()
+        if not await throttle.aallow_request(request, self):
+            raise exceptions.Throttled(throttle.wait())
+
+    def handle_exception(self, request, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.auth_header = self.authenticator.authenticate_header(request)
+        response = api_settings.EXCEPTION_HANDLER(exc, {'view': self, 'request': request})
+        if response is None:
+            raise exc
+        return response
+
+    def finalize_response(self, response):
+        """
+        Renders a DRF Response to a plain HttpResponse. Django would otherwise render it
+        through sync_to_async, costing a thread hop per request.
+        """
+        if not isinstance(response, Response):
+            return response
+        rendered = HttpResponse(
+            FastJSONRenderer().render(response.data), status=response.status_code, content_type='application/json'
+        )
+        for header, value in response.items():
+            rendered[header] = value
+        return rendered
+
+    def get_queryset(self, request):
+        restaurant_id = get_restaurant_id(request)
+        if restaurant_id is None:
+            return Recipe.objects.none()
+        return Recipe.objects.filter(restaurant_id=restaurant_id).order_by('-updated_at', '-id')
+
+    async def get_validators(self, restaurant_id, request, pk):
+        if pk is None:
+            return await conditional.alist_validators(restaurant_id, request)
+        return await conditional.adetail_validators(restaurant_id, pk)
+
+    async def conditional_response(self, handler, request, pk=None):
+        """
+        Same flow as RecipeViewSet.conditional_response: 304 when the client's copy is current,
+        else the shared response cache, else run the handler and cache its result.
+        """
+        restaurant_id = get_restaurant_id(request)
+        if restaurant_id is None:
+            return await handler(request, pk)
+
+        validators = None
+        if conditional.has_conditional_headers(request):
+            validators = await self.get_validators(restaurant_id, request, pk)
+            if validators is None:
+                return await handler(request, pk)
+            response = conditional.not_modified_response(request, validators)
+            if response is not None:
+                return response
+
+        key = await cache.aresponse_key(restaurant_id, self.action, request, pk)
+        entry = await cache.get_cache().aget(key)
+        if entry is not None:
+            cache.stats.record(hit=True)
+            response = Response(entry['data'])
+            response['X-Cache'] = 'HIT'
+            return conditional.set_validator_headers(response, entry['validators'])
+
+        cache.stats.record(hit=False)
+        if validators is None:
+            validators = await self.get_validators(restaurant_id, request, pk)
+        response = await handler(request, pk)
+        response['X-Cache'] = 'MISS'
+        if response.status_code == 200 and validators is not None:
+            await cache.get_cache().aset(key, {'data': response.data, 'validators': validators}, cache.get_timeout())
+            conditional.set_validator_headers(response, validators)
+        return response
+
+
+class AsyncRecipeListView(AsyncRecipeView):
+    """
+    Async twin of GET /recipes/: the restaurant's recipes, with ?search= and ?page_size=.
+    """
+    action = 'list'
+
+    async def get(self, request):
+        self.fields = fastpath.requested_fields(request.query_params, fastpath.LIST_FIELDS)
+        return await self.conditional_response(self.list, request)
+
+    async def list(self, request, pk=None):
+        queryset = RecipeSearchFilter().filter_queryset(request, self.get_queryset(request), self)
+        paginator = RecipeCursorPagination()
+        if fastpath.enabled() or self.fields:
+            return await self.fast_list(request, queryset, paginator)
+        page_queryset = paginator.get_page_queryset(queryset, request)
+        if page_queryset is None:
+            recipes = [recipe async for recipe in queryset.aiterator()]
+            return Response(RecipeListSerializer(recipes, many=True).data)
+
+        page = paginator.set_page([recipe async for recipe in page_queryset.aiterator()])
+        return paginator.get_paginated_response(RecipeListSerializer(page, many=True).data)
+
+    async def fast_list(self, request, queryset, paginator):
+        fields = self.fields
+        queryset = queryset.using(queryset.db)
+        expand = fastpath.wants_lines(fields, fastpath.LIST_FIELDS)
+        page_queryset = paginator.get_page_queryset(fastpath.list_rows(queryset, paginated=True, fields=fields), request)
+        if page_queryset is None:
+            rows = [row async for row in fastpath.list_rows(queryset, fields=fields).aiterator()]
+            lines = await fastpath.alines_by_recipe(queryset.values('pk'), queryset.db) if expand else None
+            return Response(fastpath.list_data(rows, fields, lines))
+
+        page = paginator.set_page([row async for row in page_queryset.aiterator()])
+        lines = await fastpath.alines_by_recipe([row.pk for row in page], queryset.db) if expand else None
+        return paginator.get_paginated_response(fastpath.list_data(page, fields, lines))
+
+
+class AsyncRecipeDetailView(AsyncRecipeView):
+    """
+    Async twin of GET /recipes/{id}/.
+    """
+    action = 'retrieve'
+
+    async def get(self, request, pk):
+        self.fields = fastpath.requested_fields(request.query_params, fastpath.DETAIL_FIELDS)
+        return await self.conditional_response(self.retrieve, request, pk)
+
+    async def retrieve(self, request, pk):
+        fast = fastpath.enabled() or self.fields
+        if fast:
+            queryset = fastpath.detail_rows(self.get_queryset(request), self.fields)
+        else:
+            queryset = self.get_queryset(request).prefetch_related(ingredient_lines_prefetch())
+        try:
+            recipe = await queryset.aget(pk=pk)
+        except (Recipe.DoesNotExist, TypeError, ValueError):
+            raise Http404('No Recipe matches the given query.')
+        if fast:
+            lines = ()
+            if fastpath.wants_lines(self.fields, fastpath.DETAIL_FIELDS):
+                lines = [line async for line in fastpath.line_rows(recipe.pk, queryset.db)]
+            return Response(fastpath.detail_data(recipe, lines, self.fields))
+        return Response(RecipeDetailSerializer(recipe).data)
+
+
+class RecipeEventStreamView(AsyncRecipeView):
+    """
+    Server-sent events for the restaurant's recipe writes: GET /recipes/events/. Needs ASGI,
+    since each open stream is a coroutine waiting on the event loop rather than a thread.
+    """
+    action = 'events'
+
+    async def authenticate(self, request):
+        # Browsers' EventSource can't set headers, so a stream ticket may come as ?ticket=.
+        ticket = request.query_params.get('ticket')
+        if ticket and self.authenticator.get_header(request) is None:
+            try:
+                user_id = events.read_ticket(ticket)
+            except signing.BadSignature:
+                raise exceptions.AuthenticationFailed('Invalid or expired stream ticket.', code='invalid_ticket')
+            user = await self.authenticator.aload_user(user_id)
+            if not user.is_active:
+                raise exceptions.AuthenticationFailed('User is inactive', code='user_inactive')
+            request.user, request.auth = user, None
+            return
+        await super().authenticate(request)
+
+    async def get(self, request):
+        restaurant_id = get_restaurant_id(request)
+        if restaurant_id is None:
+            raise exceptions.PermissionDenied("Your account is not linked to a restaurant.")
+        if events.hub.connections(restaurant_id) >= events.hub.max_connections():
+            raise exceptions.Throttled(wait=events.RETRY_MS / 1000, detail='Too many open event streams.')
+        response = StreamingHttpResponse(events.stream(restaurant_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Tell nginx not to buffer the stream.
+        return response
@@ -0,0 +1,155 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .instrumentation import phase
+
+
+class UserCache:
+    """
+    Small in-process TTL cache of authenticated users (with their profile already loaded).
+    Disabled unless RECIPES_AUTH_CACHE_TTL is set; entries are dropped when the user or
+    profile is saved in this process, and otherwise live at most TTL seconds. Every request
+    gets its own copy, so changes one makes to request.user never reach another's.
+    """
+    max_entries = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'RECIPES_AUTH_CACHE_TTL', 0)
+
+    def get(self, user_id):
+        if not self.ttl:
+            return None
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return self._copy(entry[1])
+
+    def set(self, user_id, user):
+        if not self.ttl:
+            return
+        user = self._copy(user)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+
+    @staticmethod
+    def _copy(user):
+        # Model instances copy their state and related-object cache along with them; the
+        # profile is copied too, and pointed back at the copy.
+        user = copy.copy(user)
+        profile = user._state.fields_cache.get('profile')
+        if profile is not None:
+            profile = copy.copy(profile)
+            profile._state.fields_cache['user'] = user
+            user._state.fields_cache['profile'] = profile
+        return user
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+class RestaurantJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that loads the user together with their profile in one joined query,
+    so the restaurant id is available for the rest of the request without further lookups.
+    """
+
+    def authenticate(self, request):
+        with phase('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            try:
+                user = self.user_model.objects.select_related('profile').get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, user)
+        return self.check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of authenticate() for the async views. Decoding the token is pure
+        CPU work; only the user lookup (when it isn't cached) awaits the database.
+        """
+        with phase('auth'):
+            header = self.get_header(request)
+            if header is None:
+                return None
+
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        return self.check_user(await self.aload_user(self.get_user_id(validated_token)), validated_token)
+
+    async def aload_user(self, user_id):
+        user = user_cache.get(user_id)
+        if user is None:
+            try:
+                user = await self.user_model.objects.select_related('profile').aget(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, user)
+        return user
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+def get_restaurant_id(request):
+    """
+    Returns the authenticated user's restaurant id, or None. Memoized on the request, so
+    the queryset, permission check and create hook all share one lookup.
+    """
+    try:
+        return request._recipes_restaurant_id
+    except AttributeError:
+        pass
+    user = request.user
+    restaurant_id = user.profile.restaurant_id if hasattr(user, 'profile') else None
+    request._recipes_restaurant_id = restaurant_id
+    return restaurant_id
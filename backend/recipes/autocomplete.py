@@ -0,0 +1,134 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+# In-process prefix index over Ingredient.name, for /api/ingredients/autocomplete/.
+#
+# Two sorted arrays of (normalized key, ingredient id): one keyed on the whole name, one on
+# every later word of it, so "bas" finds "Fresh Basil" too. A lookup is a bisect plus a walk
+# over at most `limit` matches, without touching the database. The index is built lazily on
+# the first lookup, kept up to date incrementally by signals for ingredients written in this
+# process, and rebuilt after RECIPES_AUTOCOMPLETE_TTL seconds to pick up other processes' writes.
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def normalize(text):
+    return ' '.join(text.split()).casefold()
+
+
+def _word_keys(key):
+    start = key.find(' ')
+    while start != -1:
+        yield key[start + 1:]
+        start = key.find(' ', start + 1)
+
+
+def _delete(keys, entry):
+    index = bisect.bisect_left(keys, entry)
+    if index < len(keys) and keys[index] == entry:
+        del keys[index]
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'RECIPES_AUTOCOMPLETE_TTL', 300)
+
+    def clear(self):
+        with self._lock:
+            self._names = None  # id -> name; None until built
+            self._keys = []
+            self._word_keys = []
+            self._expires = 0.0
+
+    def build(self):
+        from .models import Ingredient
+
+        names = dict(Ingredient.objects.values_list('id', 'name'))
+        keys, word_keys = [], []
+        for pk, name in names.items():
+            key = normalize(name)
+            keys.append((key, pk))
+            word_keys.extend((word, pk) for word in _word_keys(key))
+        keys.sort()
+        word_keys.sort()
+        with self._lock:
+            self._names, self._keys, self._word_keys = names, keys, word_keys
+            self._expires = time.monotonic() + self.ttl
+
+    def ensure_built(self):
+        if self._names is None or self._expires < time.monotonic():
+            self.build()
+
+    def lookup(self, query, limit=DEFAULT_LIMIT):
+        """
+        Up to `limit` (id, name) pairs whose name, or a word in it, starts with `query`:
+        whole-name matches first, each group in alphabetical order.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        self.ensure_built()
+        with self._lock:
+            found = {}
+            for keys in (self._keys, self._word_keys):
+                index = bisect.bisect_left(keys, (prefix,))
+                while len(found) < limit and index < len(keys) and keys[index][0].startswith(prefix):
+                    pk = keys[index][1]
+                    found.setdefault(pk, self._names[pk])
+                    index += 1
+            return list(found.items())
+
+    def add(self, pk, name):
+        with self._lock:
+            if self._names is None:
+                return  # Not built yet: the first lookup will read it from the database.
+            self._remove(pk)
+            self._names[pk] = name
+            key = normalize(name)
+            bisect.insort(self._keys, (key, pk))
+            for word in _word_keys(key):
+                bisect.insort(self._word_keys, (word, pk))
+
+    def discard(self, pk):
+        with self._lock:
+            if self._names is not None:
+                self._remove(pk)
+
+    def _remove(self, pk):
+        name = self._names.pop(pk, None)
+        if name is None:
+            return
+        key = normalize(name)
+        _delete(self._keys, (key, pk))
+        for word in _word_keys(key):
+            _delete(self._word_keys, (word, pk))
+
+    def add_on_commit(self, ingredients, using='default'):
+        """
+        Adds (id, name) pairs once the transaction writing them commits, so a rollback
+        never leaves names in the index that aren't in the database.
+        """
+        ingredients = list(ingredients)
+
+        def add_all():
+            for pk, name in ingredients:
+                self.add(pk, name)
+
+        if ingredients:
+            transaction.on_commit(add_all, using=using)
+
+    def discard_on_commit(self, pk, using='default'):
+        transaction.on_commit(lambda: self.discard(pk), using=using)
+
+
+index = IngredientIndex()
@@ -0,0 +1,234 @@
+import gc
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import renderers, search
+from .models import Recipe, UserProfile
+from .synthetic import SyntheticDataGenerator
+
+# Performance benchmarks for the recipes API.
+#
+# Each dataset size is one restaurant with that many synthetic recipes (see synthetic.py);
+# the dataset grows in place from one size to the next. Every scenario goes through the DRF
+# test client with JWT auth and the response cache off, and records latency percentiles,
+# the most SQL queries any single request made, and the peak memory allocated while
+# serving one request (the largest of a few).
+
+SCENARIOS = ('list', 'retrieve', 'search', 'create', 'update')
+DEFAULT_SIZES = (1000, 10000, 100000)
+SEARCH_TERMS = ('chicken', 'curry', 'smoky beef', 'garlic', 'lemon pasta')
+PAGE_SIZE = 50
+WARMUP = 3
+MEMORY_SAMPLES = 3
+
+
+def _percentile(samples, percent):
+    if len(samples) < 2:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[percent - 1]
+
+
+class BenchmarkRunner:
+    """
+    Seeds each dataset size into the current database and times every scenario against it.
+    """
+
+    def __init__(self, sizes=DEFAULT_SIZES, iterations=50, seed=37, log=None):
+        self.sizes = sorted(sizes)
+        self.iterations = iterations
+        self.random = random.Random(seed)
+        self.generator = SyntheticDataGenerator(restaurants=1, recipes_per_restaurant=0, seed=seed)
+        self.log = log or (lambda message: None)
+
+    def run(self):
+        restaurant_ids = self.generator.create_restaurants()
+        self.restaurant_id = restaurant_ids[0]
+        self.ingredient_ids = self.generator.create_ingredients()
+        user = UserProfile.objects.get(restaurant_id=self.restaurant_id).user
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+        results = {}
+        seeded = 0
+        for size in self.sizes:
+            self.log(f'Seeding {size} recipes...')
+            self.generator.recipes_per_restaurant = size - seeded
+            self.generator.create_recipes(restaurant_ids, self.ingredient_ids)
+            search.rebuild_index()
+            seeded = size
+            self.recipe_ids = list(
+                Recipe.objects.filter(restaurant_id=self.restaurant_id).values_list('pk', flat=True)[:size]
+            )
+            # Timeout 0: every response is built for real rather than served from the cache.
+            # No throttling either: the benchmark is one tenant sending requests back to back.
+            with override_settings(RECIPES_CACHE_TIMEOUT=0, RECIPES_THROTTLE_RATES={}):
+                results[str(size)] = {name: self.measure(name) for name in SCENARIOS}
+            for name, metrics in results[str(size)].items():
+                self.log(
+                    f"  {name:<9} p50 {metrics['p50_ms']:8.2f} ms  p99 {metrics['p99_ms']:8.2f} ms  "
+                    f"{metrics['queries']:3} queries  {metrics['peak_kib']:8.1f} KiB"
+                )
+        return {'meta': self.meta(), 'results': results}
+
+    def meta(self):
+        return {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': self.iterations,
+        }
+
+    def measure(self, name):
+        request = getattr(self, f'request_{name}')
+        for _ in range(WARMUP):
+            request()
+
+        latencies = []
+        queries = 0
+        for _ in range(self.iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name} returned {response.status_code}: {response.content[:200]!r}')
+            queries = max(queries, len(captured))
+
+        peak = 0
+        for _ in range(MEMORY_SAMPLES):
+            gc.collect()
+            tracemalloc.start()
+            try:
+                request()
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+
+        return {
+            'p50_ms': round(_percentile(latencies, 50), 3),
+            'p99_ms': round(_percentile(latencies, 99), 3),
+            'queries': queries,
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def payload(self):
+        lines = self.random.sample(self.generator.vocabulary[:200], 10)
+        return {
+            'title': f'Benchmark {self.random.randint(1, 10 ** 6)}',
+            'instructions': '1. Prep.\n2. Cook.\n3. Serve.',
+            'yield_amount': '4 servings',
+            'ingredients': [{'name': name, 'quantity': '1.50', 'unit': 'g'} for name in lines],
+        }
+
+    def request_list(self):
+        return self.client.get('/api/recipes/', {'page_size': PAGE_SIZE})
+
+    def request_retrieve(self):
+        return self.client.get(f'/api/recipes/{self.random.choice(self.recipe_ids)}/')
+
+    def request_search(self):
+        return self.client.get('/api/recipes/', {'search': self.random.choice(SEARCH_TERMS), 'page_size': PAGE_SIZE})
+
+    def request_create(self):
+        return self.client.post('/api/recipes/', self.payload(), format='json')
+
+    def request_update(self):
+        return self.client.put(f'/api/recipes/{self.random.choice(self.recipe_ids)}/', self.payload(), format='json')
+
+
+def compare(results, baseline, threshold):
+    """
+    Lists regressions of `results` against `baseline`: p50 latency or peak memory more than
+    `threshold` (a fraction) above the baseline, or any extra SQL query. p99 is reported but
+    not gated, since a few dozen samples make it noisy.
+    """
+    regressions = []
+    for size, scenarios in results['results'].items():
+        for name, metrics in scenarios.items():
+            before = baseline.get('results', {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            label = f'{name} @ {size}'
+            if metrics['queries'] > before['queries']:
+                regressions.append(f"{label}: {before['queries']} -> {metrics['queries']} queries")
+            for key, unit in (('p50_ms', 'ms'), ('peak_kib', 'KiB')):
+                if metrics[key] > before[key] * (1 + threshold):
+                    regressions.append(f'{label}: {key} {before[key]} -> {metrics[key]} {unit}')
+    return regressions
+
+
+# Read path configurations compared by ReadPathBenchmark, slowest first.
+READ_PATHS = (
+    ('serializers + json', {'RECIPES_FAST_READS': False, 'RECIPES_ORJSON': False}),
+    ('serializers + orjson', {'RECIPES_FAST_READS': False, 'RECIPES_ORJSON': True}),
+    ('values + orjson', {'RECIPES_FAST_READS': True, 'RECIPES_ORJSON': True}),
+)
+
+
+class ReadPathBenchmark:
+    """
+    Measures list and detail throughput with and without the read fast path (see fastpath.py
+    and renderers.py) on one restaurant of `size` recipes, and checks every configuration
+    returns the same bytes.
+    """
+
+    def __init__(self, size=10000, iterations=30, seed=37, log=None):
+        self.size = size
+        self.iterations = iterations
+        self.generator = SyntheticDataGenerator(restaurants=1, recipes_per_restaurant=size, seed=seed)
+        self.log = log or (lambda message: None)
+
+    def run(self):
+        self.log(f'Seeding {self.size} recipes...')
+        restaurant_ids = self.generator.create_restaurants()
+        self.generator.create_recipes(restaurant_ids, self.generator.create_ingredients())
+        user = UserProfile.objects.get(restaurant_id=restaurant_ids[0]).user
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        recipe_id = Recipe.objects.filter(restaurant_id=restaurant_ids[0]).values_list('pk', flat=True).first()
+
+        scenarios = (
+            ('full list', '/api/recipes/', {}),
+            ('page of 100', '/api/recipes/', {'page_size': 100}),
+            ('retrieve', f'/api/recipes/{recipe_id}/', {}),
+        )
+        results = {}
+        for scenario, url, params in scenarios:
+            results[scenario] = {}
+            expected = None
+            for label, overrides in READ_PATHS:
+                with override_settings(RECIPES_CACHE_TIMEOUT=0, RECIPES_SLOW_REQUEST_MS=0, RECIPES_THROTTLE_RATES={},
+                                       **overrides):
+                    body = self.client.get(url, params).content
+                    latencies = []
+                    started = time.perf_counter()
+                    for _ in range(self.iterations):
+                        request_started = time.perf_counter()
+                        self.client.get(url, params)
+                        latencies.append((time.perf_counter() - request_started) * 1000)
+                    elapsed = time.perf_counter() - started
+                expected = body if expected is None else expected
+                results[scenario][label] = {
+                    'requests_per_s': round(self.iterations / elapsed, 1),
+                    'p50_ms': round(_percentile(latencies, 50), 3),
+                    'bytes': len(body),
+                    'identical': body == expected,
+                }
+                metrics = results[scenario][label]
+                self.log(
+                    f"  {scenario:<12} {label:<21} {metrics['requests_per_s']:8.1f} req/s  "
+                    f"p50 {metrics['p50_ms']:8.2f} ms  {metrics['bytes']:9} bytes"
+                    f"{'' if metrics['identical'] else '  DIFFERENT OUTPUT'}"
+                )
+        return {'meta': {'size': self.size, 'iterations': self.iterations, 'orjson': renderers.orjson is not None},
+                'results': results}
@@ -0,0 +1,130 @@
+import json
+
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import events
+from .models import Recipe, RecipeIngredient
+from .serializers import RecipeDetailSerializer, ingredient_lines_prefetch, resolve_ingredient_ids
+from .signals import batched_recipe_changes, recipe_changed
+
+# Bulk import and export of recipes.
+#
+# Import validates records one at a time but writes them a batch at a time: one
+# transaction, one ingredient lookup, one INSERT for the recipes and one for their
+# ingredient lines per batch. Export streams NDJSON straight off a server-side iterator.
+# Neither ever holds more than one batch in memory (apart from a JSON array upload,
+# which has to be parsed in one go; send NDJSON for really large imports).
+
+BATCH_SIZE = 500
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+MAX_REPORTED_ERRORS = 100
+
+
+def iter_ndjson(stream):
+    """
+    Yields (line number, parsed record or the JSONDecodeError) for each non-blank line.
+    """
+    for number, raw in enumerate(iter(stream.readline, b''), start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            yield number, json.loads(raw)
+        except ValueError as exc:
+            yield number, exc
+
+
+class RecipeImporter:
+    """
+    Imports recipe records (the same shape the detail endpoint accepts) into one restaurant.
+    """
+
+    def __init__(self, restaurant_id, batch_size=BATCH_SIZE):
+        self.restaurant_id = restaurant_id
+        self.batch_size = batch_size
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def run(self, records):
+        """
+        `records` is an iterable of (line number, record). Invalid records are skipped and
+        reported; everything valid is written. Returns the summary.
+        """
+        batch = []
+        for number, record in records:
+            validated = self.validate(number, record)
+            if validated is None:
+                continue
+            batch.append(validated)
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+        return self.summary()
+
+    def validate(self, number, record):
+        if isinstance(record, Exception):
+            return self.add_error(number, {'non_field_errors': [f'Invalid JSON: {record}']})
+        if not isinstance(record, dict):
+            return self.add_error(number, {'non_field_errors': ['Expected a JSON object.']})
+        serializer = RecipeDetailSerializer(data=record)
+        if not serializer.is_valid():
+            return self.add_error(number, serializer.errors)
+        return serializer.validated_data
+
+    def add_error(self, number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': number, 'errors': errors})
+        return None
+
+    @transaction.atomic
+    def write(self, batch):
+        ingredient_ids = resolve_ingredient_ids(
+            item['ingredient']['name'] for data in batch for item in data['ingredients'] if not item.get('delete')
+        )
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                restaurant_id=self.restaurant_id,
+                title=data['title'],
+                instructions=data['instructions'],
+                yield_amount=data['yield_amount'],
+            )
+            for data in batch
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_ids[item['ingredient']['name']],
+                quantity=item['quantity'],
+                unit=item['unit'],
+            )
+            for recipe, data in zip(recipes, batch)
+            for item in data['ingredients'] if not item.get('delete')
+        ])
+        # bulk_create() sends no signals: reindex and invalidate explicitly, once per batch.
+        with batched_recipe_changes():
+            for recipe in recipes:
+                recipe_changed(recipe.pk, recipe._state.db, self.restaurant_id, events.CREATED)
+        self.created += len(recipes)
+
+    def summary(self):
+        return {
+            'created': self.created,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def export_ndjson(queryset, chunk_size=BATCH_SIZE):
+    """
+    Yields one NDJSON line per recipe. Recipes are read with a server-side iterator and their
+    ingredient lines are prefetched per chunk, so memory use doesn't grow with the catalogue.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    recipes = queryset.order_by('id').prefetch_related(ingredient_lines_prefetch()).iterator(chunk_size=chunk_size)
+    for recipe in recipes:
+        yield encoder.encode(RecipeDetailSerializer(recipe).data) + '\n'
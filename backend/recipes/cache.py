@@ -0,0 +1,124 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Response cache for recipe reads.
+#
+# Every key embeds a per-restaurant generation number. Any write to that restaurant's
+# recipes bumps the generation, so all of its cached responses become unreachable at
+# once (and age out of the size-bounded cache) while other restaurants keep theirs.
+CACHE_ALIAS = 'recipes'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(restaurant_id):
+    return f'recipes:gen:{restaurant_id}'
+
+
+def get_generation(restaurant_id):
+    cache = get_cache()
+    key = _generation_key(restaurant_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Seed from the clock rather than 0, so a generation that was evicted can never
+        # come back with a value some still-cached response was stored under.
+        generation = time.time_ns()
+        if not cache.add(key, generation, timeout=None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+async def aget_generation(restaurant_id):
+    cache = get_cache()
+    key = _generation_key(restaurant_id)
+    generation = await cache.aget(key)
+    if generation is None:
+        generation = time.time_ns()
+        if not await cache.aadd(key, generation, timeout=None):
+            generation = await cache.aget(key, generation)
+    return generation
+
+
+def _bump(restaurant_id):
+    cache = get_cache()
+    try:
+        cache.incr(_generation_key(restaurant_id))
+    except ValueError:
+        # Not cached yet (or evicted): any fresh seed invalidates everything.
+        cache.set(_generation_key(restaurant_id), time.time_ns(), timeout=None)
+
+
+def invalidate_restaurant(restaurant_id):
+    """
+    Drops every cached response for a restaurant.
+
+    Bumps immediately, so the writing request never reads its own stale data, and again
+    on commit, so a response another request cached from pre-commit data is dropped too.
+    """
+    if restaurant_id is None:
+        return
+    _bump(restaurant_id)
+    transaction.on_commit(lambda: _bump(restaurant_id))
+
+
+def response_key(restaurant_id, action, request, pk=None):
+    """
+    Key for one cached response: restaurant, action, object id, and the query string
+    (search term, page size and cursor).
+    """
+    return _response_key(restaurant_id, get_generation(restaurant_id), action, request, pk)
+
+
+async def aresponse_key(restaurant_id, action, request, pk=None):
+    return _response_key(restaurant_id, await aget_generation(restaurant_id), action, request, pk)
+
+
+def _response_key(restaurant_id, generation, action, request, pk):
+    query = '&'.join(f'{k}={v}' for k, v in sorted(request.GET.lists()))
+    digest = hashlib.md5(query.encode('utf-8'), usedforsecurity=False).hexdigest()
+    return f'recipes:resp:{restaurant_id}:{generation}:{action}:{pk or ""}:{digest}'
+
+
+def get_timeout():
+    return getattr(settings, 'RECIPES_CACHE_TIMEOUT', 300)
+
+
+class CacheStats:
+    """
+    Per-process hit/miss counters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else None,
+            }
+
+
+stats = CacheStats()
@@ -0,0 +1,135 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Change log behind the delta sync feed, GET /api/recipes/changes/?since=<token>.
+#
+# Every recipe write appends a RecipeChange row per recipe, numbered from its restaurant's
+# own sequence (Restaurant.change_seq), in the same transaction as the write: signals._flush
+# records them for the serializers, the admin, bulk imports and ingredient renames alike.
+# Bumping the sequence locks the restaurant's row until commit, so one restaurant's numbers
+# become visible in order and a client never skips past a change still being written.
+#
+# A token is just the last sequence number a client has seen. Reading the changes after it
+# is one range scan over (restaurant, seq), so sync traffic follows the number of changes
+# rather than the size of the catalogue. compact() drops rows made redundant by a later
+# change to the same recipe, and tombstones old enough that every client should have seen
+# them; tokens from before a dropped tombstone are then refused with a 410.
+
+PAGE_SIZE = 500
+CHUNK_SIZE = 500
+TOMBSTONE_DAYS = 30
+
+
+class ResyncRequired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'This sync token has expired; download the full recipe list and start again.'
+    default_code = 'resync_required'
+
+
+def record(changes, deleted, using='default'):
+    """
+    Logs {recipe id: restaurant id} as changed (or deleted, for ids in `deleted`): one UPDATE
+    and one SELECT per restaurant, then a single INSERT. Returns the RecipeChange rows.
+    """
+    from .models import RecipeChange, Restaurant
+
+    by_restaurant = {}
+    for recipe_id, restaurant_id in changes.items():
+        if restaurant_id is not None:
+            by_restaurant.setdefault(restaurant_id, []).append(recipe_id)
+    if not by_restaurant:
+        return []
+    # No savepoint of its own: this runs inside the write's transaction whenever there is one.
+    with transaction.atomic(using=using, savepoint=False):
+        rows = []
+        for restaurant_id, recipe_ids in sorted(by_restaurant.items()):
+            restaurants = Restaurant.objects.using(using).filter(pk=restaurant_id)
+            restaurants.update(change_seq=F('change_seq') + len(recipe_ids))
+            last = restaurants.values_list('change_seq', flat=True).first()
+            if last is None:
+                continue  # The restaurant itself is being deleted.
+            rows.extend(
+                RecipeChange(restaurant_id=restaurant_id, seq=seq, recipe_id=recipe_id, deleted=recipe_id in deleted)
+                for seq, recipe_id in enumerate(sorted(recipe_ids), start=last - len(recipe_ids) + 1)
+            )
+        return RecipeChange.objects.using(using).bulk_create(rows)
+
+
+def current_token(restaurant_id, using='default'):
+    from .models import Restaurant
+
+    return Restaurant.objects.using(using).filter(pk=restaurant_id).values_list('change_seq', flat=True).first() or 0
+
+
+def changes_since(restaurant_id, since, using='default', limit=None):
+    """
+    The changes after token `since`, up to `limit` of them, as (changed ids, deleted ids, next
+    token, more). A recipe changed several times is listed once, as of its latest change.
+    Raises ResyncRequired for a token older than a compacted tombstone, and ValueError for
+    one from the future.
+    """
+    from .models import RecipeChange, Restaurant
+
+    limit = limit or PAGE_SIZE
+    seq, floor = Restaurant.objects.using(using).filter(pk=restaurant_id).values_list(
+        'change_seq', 'change_floor'
+    ).first() or (0, 0)
+    if since > seq:
+        raise ValueError(since)
+    if since < floor:
+        raise ResyncRequired()
+    log = RecipeChange.objects.using(using).filter(restaurant_id=restaurant_id, seq__gt=since).order_by('seq')
+    entries = list(log.values_list('seq', 'recipe_id', 'deleted')[:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+    latest = {}
+    for _, recipe_id, is_deleted in entries:
+        latest.pop(recipe_id, None)  # Re-insert, so recipes come out in order of their last change.
+        latest[recipe_id] = is_deleted
+    changed = [recipe_id for recipe_id, is_deleted in latest.items() if not is_deleted]
+    removed = [recipe_id for recipe_id, is_deleted in latest.items() if is_deleted]
+    return changed, removed, entries[-1][0] if entries else since, more
+
+
+def compact(using='default', tombstone_days=TOMBSTONE_DAYS, chunk_size=CHUNK_SIZE, log=None):
+    """
+    Drops changes superseded by a later one to the same recipe, tombstones older than
+    `tombstone_days`, and the log of restaurants that no longer exist. One transaction per
+    restaurant, which also raises its floor past the dropped tombstones. Returns the number
+    of rows deleted.
+    """
+    from .models import RecipeChange, Restaurant
+
+    log = log or (lambda message: None)
+    cutoff = timezone.now() - datetime.timedelta(days=tombstone_days)
+    changes = RecipeChange.objects.using(using)
+    restaurant_ids = set(Restaurant.objects.using(using).values_list('pk', flat=True))
+    total = 0
+    for restaurant_id in changes.order_by('restaurant_id').values_list('restaurant_id', flat=True).distinct():
+        rows = changes.filter(restaurant_id=restaurant_id)
+        with transaction.atomic(using=using):
+            if restaurant_id not in restaurant_ids:
+                total += rows.delete()[0]
+                continue
+            seen, doomed, floor = set(), [], 0
+            entries = rows.order_by('-seq').values_list('pk', 'seq', 'recipe_id', 'deleted', 'changed_at')
+            for pk, seq, recipe_id, is_deleted, changed_at in entries.iterator(chunk_size=chunk_size):
+                if recipe_id in seen:
+                    doomed.append(pk)
+                    continue
+                seen.add(recipe_id)
+                if is_deleted and changed_at < cutoff:
+                    doomed.append(pk)
+                    floor = max(floor, seq)
+            for start in range(0, len(doomed), chunk_size):
+                RecipeChange.objects.using(using).filter(pk__in=doomed[start:start + chunk_size]).delete()
+            if floor:
+                Restaurant.objects.using(using).filter(pk=restaurant_id, change_floor__lt=floor).update(change_floor=floor)
+        total += len(doomed)
+        log(f'  restaurant {restaurant_id}: {len(doomed)} changes removed')
+    return total
@@ -0,0 +1,123 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Recipe
+
+# Conditional request support (ETag / Last-Modified) for recipes.
+#
+# Detail validators come from the recipe's updated_at; list validators from a per-restaurant
+# version (latest updated_at plus row count, so deletes show up too) combined with the query
+# string. Either costs one indexed query and no serialization.
+
+CONDITIONAL_HEADERS = (
+    'HTTP_IF_MATCH',
+    'HTTP_IF_NONE_MATCH',
+    'HTTP_IF_MODIFIED_SINCE',
+    'HTTP_IF_UNMODIFIED_SINCE',
+)
+
+LIST_VERSION = {'latest': Max('updated_at'), 'count': Count('id')}
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The recipe has been modified since you last fetched it.'
+    default_code = 'precondition_failed'
+
+
+def _etag(*parts):
+    digest = hashlib.sha1(':'.join(str(p) for p in parts).encode('utf-8'), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def has_conditional_headers(request):
+    return any(header in request.META for header in CONDITIONAL_HEADERS)
+
+
+def recipe_etag(recipe_id, updated_at):
+    return _etag('recipe', recipe_id, updated_at.isoformat())
+
+
+def detail_validators(restaurant_id, pk):
+    """
+    Returns (etag, last_modified) for one of the restaurant's recipes, or None if it doesn't exist.
+    """
+    try:
+        updated_at = _detail_version(restaurant_id, pk).first()
+    except (TypeError, ValueError):
+        return None
+    return _detail_validators(pk, updated_at)
+
+
+async def adetail_validators(restaurant_id, pk):
+    try:
+        updated_at = await _detail_version(restaurant_id, pk).afirst()
+    except (TypeError, ValueError):
+        return None
+    return _detail_validators(pk, updated_at)
+
+
+def _detail_version(restaurant_id, pk):
+    return Recipe.objects.filter(restaurant_id=restaurant_id, pk=pk).values_list('updated_at', flat=True)
+
+
+def _detail_validators(pk, updated_at):
+    if updated_at is None:
+        return None
+    return recipe_etag(pk, updated_at), updated_at
+
+
+def list_validators(restaurant_id, request):
+    """
+    Returns (etag, None) for a restaurant's recipe list. There is no Last-Modified, since
+    a delete shrinks the list without moving the latest updated_at.
+    """
+    version = Recipe.objects.filter(restaurant_id=restaurant_id).aggregate(**LIST_VERSION)
+    return _list_validators(restaurant_id, request, version)
+
+
+async def alist_validators(restaurant_id, request):
+    version = await Recipe.objects.filter(restaurant_id=restaurant_id).aaggregate(**LIST_VERSION)
+    return _list_validators(restaurant_id, request, version)
+
+
+def _list_validators(restaurant_id, request, version):
+    latest = version['latest'].isoformat() if version['latest'] else ''
+    query = '&'.join(f'{k}={v}' for k, v in sorted(request.GET.lists()))
+    return _etag('list', restaurant_id, latest, version['count'], query), None
+
+
+def not_modified_response(request, validators):
+    """
+    Returns a 304 (or 412) response if the request's conditional headers are satisfied, else None.
+    """
+    etag, last_modified = validators
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def check_write_preconditions(request, recipe):
+    """
+    Honours If-Match / If-Unmodified-Since on writes using the already loaded recipe,
+    so optimistic concurrency costs no extra read.
+    """
+    if not has_conditional_headers(request):
+        return
+    response = get_conditional_response(
+        request, etag=recipe_etag(recipe.pk, recipe.updated_at), last_modified=int(recipe.updated_at.timestamp())
+    )
+    if response is not None and response.status_code == status.HTTP_412_PRECONDITION_FAILED:
+        raise PreconditionFailed()
+
+
+def set_validator_headers(response, validators):
+    etag, last_modified = validators
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
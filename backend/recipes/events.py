@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Push of recipe changes to browsers, as server-sent events (GET /api/recipes/events/).
+#
+# Every write logged by changes.record() is published once its transaction commits, as
+# {'type': 'created' | 'updated' | 'deleted', 'id': recipe id, 'seq': change log sequence}.
+# The hub fans events out to the streams open in this process for the recipe's restaurant.
+# Publishing goes through a backend: LocalBackend delivers straight to this process's hub;
+# RedisBackend sends events through Redis pub/sub, so every worker's hub receives them.
+#
+# Writes happen on request threads and streams live on the event loop, so delivery hands
+# each event to the stream's loop. A stream buffers at most RECIPES_EVENTS_QUEUE_SIZE events;
+# a client that falls further behind is sent a 'resync' event and disconnected, and catches
+# up through GET /api/recipes/changes/?since=<its last seq> rather than growing the buffer.
+#
+# EventSource can't send an Authorization header, and a URL ends up in access logs and
+# browser history, so the stream doesn't take the access token in its query string. Clients
+# trade it for a ticket (POST /api/recipes/events/ticket/): signed, good for nothing but
+# opening a stream, and only for RECIPES_EVENTS_TICKET_TTL seconds.
+
+logger = logging.getLogger(__name__)
+
+CREATED, UPDATED, DELETED = 'created', 'updated', 'deleted'
+RETRY_MS = 3000
+
+
+class Overflow(Exception):
+    pass
+
+
+class Subscription:
+    """
+    One open stream: a bounded queue of events, filled from any thread, read on its loop.
+    """
+
+    def __init__(self, restaurant_id, max_size):
+        self.restaurant_id = restaurant_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_size)
+        self.overflowed = False
+        self.last_seq = None
+
+    def offer(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # The loop is closed; the stream is gone.
+
+    def _put(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # Wake the reader even if it is waiting: it will find the flag and stop.
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self, timeout):
+        """
+        The next event, or None after `timeout` seconds without one. Raises Overflow once
+        events have been dropped.
+        """
+        if self.overflowed:
+            raise Overflow()
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if self.overflowed:
+            raise Overflow()
+        self.last_seq = event['seq']
+        return event
+
+
+class LocalBackend:
+    """
+    Single process: delivers events straight to this process's hub.
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, restaurant_id, event):
+        self.hub.deliver(restaurant_id, event)
+
+
+class RedisBackend:
+    """
+    Several workers: events go through a Redis pub/sub channel (RECIPES_EVENTS_REDIS_URL),
+    and a listener thread in each worker delivers them to its hub.
+    """
+    channel = 'recipes:events'
+
+    def __init__(self, hub):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBackend needs the redis package (pip install redis).')
+        url = getattr(settings, 'RECIPES_EVENTS_REDIS_URL', '')
+        if not url:
+            raise ImproperlyConfigured('RedisBackend needs RECIPES_EVENTS_REDIS_URL.')
+        self.hub = hub
+        self.redis = redis
+        self.client = redis.Redis.from_url(url)
+        threading.Thread(target=self.listen, name='recipes-events', daemon=True).start()
+
+    def publish(self, restaurant_id, event):
+        self.client.publish(self.channel, json.dumps([restaurant_id, event]))
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    restaurant_id, event = json.loads(message['data'])
+                    self.hub.deliver(restaurant_id, event)
+            except self.redis.RedisError:
+                logger.warning('Lost the recipe event channel; reconnecting.', exc_info=True)
+                time.sleep(1)
+
+
+class EventHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # restaurant id -> set of Subscription
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    path = getattr(settings, 'RECIPES_EVENTS_BACKEND', 'recipes.events.LocalBackend')
+                    self._backend = import_string(path)(self)
+        return self._backend
+
+    def max_connections(self):
+        return getattr(settings, 'RECIPES_EVENTS_MAX_CONNECTIONS', 100)
+
+    def subscribe(self, restaurant_id):
+        """
+        Opens a subscription on the running loop, or returns None if the restaurant already
+        has RECIPES_EVENTS_MAX_CONNECTIONS streams open in this process.
+        """
+        subscription = Subscription(restaurant_id, getattr(settings, 'RECIPES_EVENTS_QUEUE_SIZE', 100))
+        with self._lock:
+            subscriptions = self._subscriptions.setdefault(restaurant_id, set())
+            if len(subscriptions) >= self.max_connections():
+                return None
+            subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.restaurant_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.restaurant_id, None)
+
+    def connections(self, restaurant_id=None):
+        with self._lock:
+            if restaurant_id is not None:
+                return len(self._subscriptions.get(restaurant_id, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, restaurant_id, event):
+        self.backend.publish(restaurant_id, event)
+
+    def deliver(self, restaurant_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(restaurant_id, ()))
+        for subscription in subscriptions:
+            subscription.offer(event)
+
+    def publish_on_commit(self, changes, kinds, using='default'):
+        """
+        Publishes logged RecipeChange rows once the transaction writing them commits;
+        `kinds` marks created and deleted recipes ({recipe id: kind}), the rest are updates.
+        """
+        events = [
+            (change.restaurant_id, {
+                'type': kinds.get(change.recipe_id, UPDATED), 'id': change.recipe_id, 'seq': change.seq,
+            })
+            for change in changes
+        ]
+
+        def publish_all():
+            for restaurant_id, event in events:
+                try:
+                    self.publish(restaurant_id, event)
+                except Exception:
+                    # Clients catch up through the change feed; never fail the write over it.
+                    logger.warning('Could not publish a recipe event.', exc_info=True)
+
+        if events:
+            transaction.on_commit(publish_all, using=using)
+
+
+hub = EventHub()
+
+
+TICKET_SALT = 'recipes.events.ticket'
+
+
+def ticket_ttl():
+    return getattr(settings, 'RECIPES_EVENTS_TICKET_TTL', 30)
+
+
+def issue_ticket(user):
+    """
+    A ticket that lets `user` open a stream in the next RECIPES_EVENTS_TICKET_TTL seconds.
+    """
+    return signing.TimestampSigner(salt=TICKET_SALT).sign(str(user.pk))
+
+
+def read_ticket(ticket):
+    """
+    The user id a ticket was issued to. Raises signing.BadSignature (SignatureExpired once
+    its time is up) for anything else.
+    """
+    return signing.TimestampSigner(salt=TICKET_SALT).unsign(ticket, max_age=ticket_ttl())
+
+
+def format_event(event):
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream(restaurant_id):
+    """
+    The SSE body for one of the restaurant's clients: events as they come, a comment every
+    RECIPES_EVENTS_HEARTBEAT seconds so proxies keep the connection open, and the end of the
+    stream after RECIPES_EVENTS_IDLE_TIMEOUT seconds without an event (the client reconnects
+    with a new ticket). Subscribes on the first read, so a stream that is never sent holds
+    nothing, and unsubscribes however it ends, client disconnects included.
+    """
+    heartbeat = getattr(settings, 'RECIPES_EVENTS_HEARTBEAT', 15)
+    idle_timeout = getattr(settings, 'RECIPES_EVENTS_IDLE_TIMEOUT', 300)
+    loop = asyncio.get_running_loop()
+    subscription = hub.subscribe(restaurant_id)
+    if subscription is None:
+        return
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        idle_until = loop.time() + idle_timeout
+        while (remaining := idle_until - loop.time()) > 0:
+            try:
+                event = await subscription.get(min(heartbeat, remaining))
+            except Overflow:
+                # Events were dropped: the client reads them from the change feed instead.
+                yield f"event: resync\ndata: {json.dumps({'type': 'resync', 'since': subscription.last_seq})}\n\n"
+                return
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            idle_until = loop.time() + idle_timeout
+            yield format_event(event)
+    finally:
+        hub.unsubscribe(subscription)
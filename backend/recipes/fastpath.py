@@ -0,0 +1,206 @@
+from operator import attrgetter
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .instrumentation import phase
+from .models import RecipeIngredient
+from .summaries import PREVIEW_SIZE, split_names
+
+# Serializer-free payloads for recipe list and detail reads.
+#
+# RecipeListSerializer and RecipeDetailSerializer build a model instance per row and run
+# every field through a serializer field; on large lists that is most of a read's CPU time.
+# These functions fetch only the columns a payload needs with values_list() and build the
+# same dicts directly. Values that need formatting (quantities, timestamps) go through the
+# same DRF field classes the serializers use, so the output is identical, byte for byte.
+# The serializers remain the source of truth for validation, writes and write responses.
+#
+# Both reads also take sparse fieldsets: ?fields=id,title narrows a payload to those fields
+# and ?expand=ingredients adds the ingredient lines to it. Only the columns the requested
+# fields are built from are selected, and the lines are only read when they are asked for.
+
+LIST_COLUMNS = ('pk', 'title', 'yield_amount', 'ingredient_count', 'ingredient_names')
+DETAIL_COLUMNS = ('pk', 'restaurant_id', 'title', 'instructions', 'yield_amount', 'updated_at')
+
+_quantity = RecipeIngredient._meta.get_field('quantity')
+QUANTITY_FIELD = serializers.DecimalField(max_digits=_quantity.max_digits, decimal_places=_quantity.decimal_places)
+UPDATED_AT_FIELD = serializers.DateTimeField()
+
+# Every field a payload can be narrowed to, in payload order, with the columns it is built
+# from. 'ingredients' comes from the ingredient lines, fetched separately.
+FIELD_COLUMNS = {
+    'id': ('pk',),
+    'title': ('title',),
+    'instructions': ('instructions',),
+    'yield_amount': ('yield_amount',),
+    'ingredient_count': ('ingredient_count',),
+    'ingredient_preview': ('ingredient_names',),
+    'ingredients': (),
+    'updated_at': ('updated_at',),
+}
+EXPANDABLE = ('ingredients',)
+LIST_FIELDS = ('id', 'title', 'yield_amount', 'ingredient_count', 'ingredient_preview')
+DETAIL_FIELDS = ('id', 'title', 'instructions', 'yield_amount', 'ingredients', 'updated_at')
+
+FIELD_GETTERS = {
+    'id': attrgetter('pk'),
+    'title': attrgetter('title'),
+    'instructions': attrgetter('instructions'),
+    'yield_amount': attrgetter('yield_amount'),
+    'ingredient_count': attrgetter('ingredient_count'),
+    'ingredient_preview': lambda row: split_names(row.ingredient_names)[:PREVIEW_SIZE],
+    'updated_at': lambda row: UPDATED_AT_FIELD.to_representation(row.updated_at),
+}
+
+
+def enabled():
+    return getattr(settings, 'RECIPES_FAST_READS', True)
+
+
+def _split_param(query_params, name):
+    return [value.strip() for value in query_params.get(name, '').split(',') if value.strip()]
+
+
+def requested_fields(query_params, default):
+    """
+    The fields asked for with ?fields= and ?expand=, in payload order, or None when that is
+    just `default` (so the request is served as usual). Unknown names are a 400.
+    """
+    fields = _split_param(query_params, 'fields')
+    expand = _split_param(query_params, 'expand')
+    if not fields and not expand:
+        return None
+    unknown = [name for name in fields if name not in FIELD_COLUMNS]
+    if unknown:
+        raise ValidationError({'fields': [
+            f"Unknown fields: {', '.join(unknown)}. Expected any of: {', '.join(FIELD_COLUMNS)}."
+        ]})
+    unknown = [name for name in expand if name not in EXPANDABLE]
+    if unknown:
+        raise ValidationError({'expand': [
+            f"Cannot expand: {', '.join(unknown)}. Expected any of: {', '.join(EXPANDABLE)}."
+        ]})
+    wanted = {*(fields or default), *expand}
+    fields = tuple(name for name in FIELD_COLUMNS if name in wanted)
+    return None if fields == default else fields
+
+
+def wants_lines(fields, default):
+    return 'ingredients' in (default if fields is None else fields)
+
+
+def _columns(fields, *extra):
+    # Always the primary key: the lines are matched up, and lookups made, on it.
+    return tuple(dict.fromkeys(('pk', *(column for name in fields for column in FIELD_COLUMNS[name]), *extra)))
+
+
+def list_rows(queryset, paginated=False, fields=None):
+    """
+    The list columns of `queryset` (or those of `fields`) as named tuples. Rows for the cursor
+    paginator also carry `updated_at` (and a search's `search_rank`), so it can page over them
+    like over model instances;
+    parsing a timestamp per row is a good part of the cost of a long unpaginated list, so the
+    others don't.
+    """
+    columns = LIST_COLUMNS if fields is None else _columns(fields)
+    if paginated and 'updated_at' not in columns:
+        columns = (*columns, 'updated_at')
+    if paginated and 'search_rank' in queryset.query.annotations:
+        columns = (*columns, 'search_rank')  # The cursor of a search carries the rank.
+    return queryset.values_list(*columns, named=True)
+
+
+def fieldset_data(rows, fields, lines=None):
+    """
+    Payloads with just `fields` for rows from list_rows() or detail_rows(); `lines` maps the
+    recipe ids to their line rows when 'ingredients' is one of the fields.
+    """
+    getters = [
+        (name, (lambda row: line_data(lines.get(row.pk, ()))) if name == 'ingredients' else FIELD_GETTERS[name])
+        for name in fields
+    ]
+    with phase('serialize'):
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+
+def list_data(rows, fields=None, lines=None):
+    """
+    Same as RecipeListSerializer(rows, many=True).data, or fieldset_data() for `fields`.
+    """
+    if fields is not None:
+        return fieldset_data(rows, fields, lines)
+    with phase('serialize'):
+        return [
+            {
+                'id': row.pk,
+                'title': row.title,
+                'yield_amount': row.yield_amount,
+                'ingredient_count': row.ingredient_count,
+                'ingredient_preview': split_names(row.ingredient_names)[:PREVIEW_SIZE],
+            }
+            for row in rows
+        ]
+
+
+def detail_rows(queryset, fields=None):
+    # Prefetches only apply to model instances; drop any the view's queryset carries. The
+    # database is fixed here, so the lines can then be read from the same replica (`.db`).
+    # `restaurant_id` is always selected, for the object permission check.
+    columns = DETAIL_COLUMNS if fields is None else _columns(fields, 'restaurant_id')
+    return queryset.using(queryset.db).prefetch_related(None).values_list(*columns, named=True)
+
+
+def line_rows(recipe_id, using='default'):
+    lines = RecipeIngredient.objects.using(using).filter(recipe_id=recipe_id).order_by('id')
+    return lines.values_list('ingredient__name', 'quantity', 'unit')
+
+
+def _recipe_line_rows(recipe_ids, using):
+    # `recipe_ids` may also be a values('pk') queryset, for lines of a whole (unpaginated) list.
+    lines = RecipeIngredient.objects.using(using).filter(recipe_id__in=recipe_ids).order_by('id')
+    return lines.values_list('recipe_id', 'ingredient__name', 'quantity', 'unit')
+
+
+def _group_lines(line_rows):
+    grouped = {}
+    for recipe_id, name, quantity, unit in line_rows:
+        grouped.setdefault(recipe_id, []).append((name, quantity, unit))
+    return grouped
+
+
+def lines_by_recipe(recipe_ids, using='default'):
+    """
+    {recipe id: [(name, quantity, unit), ...]} for several recipes, in one query.
+    """
+    return _group_lines(_recipe_line_rows(recipe_ids, using))
+
+
+async def alines_by_recipe(recipe_ids, using='default'):
+    return _group_lines([line async for line in _recipe_line_rows(recipe_ids, using)])
+
+
+def line_data(lines):
+    return [
+        {'name': name, 'quantity': QUANTITY_FIELD.to_representation(quantity), 'unit': unit}
+        for name, quantity, unit in lines
+    ]
+
+
+def detail_data(row, lines, fields=None):
+    """
+    Same as RecipeDetailSerializer(recipe).data, from a detail row and its line rows, or
+    fieldset_data() for `fields`.
+    """
+    if fields is not None:
+        return fieldset_data([row], fields, {row.pk: lines})[0]
+    with phase('serialize'):
+        return {
+            'id': row.pk,
+            'title': row.title,
+            'instructions': row.instructions,
+            'yield_amount': row.yield_amount,
+            'ingredients': line_data(lines),
+            'updated_at': UPDATED_AT_FIELD.to_representation(row.updated_at),
+        }
@@ -0,0 +1,225 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+from . import cache
+
+# Per-request performance instrumentation.
+#
+# instrumentation_middleware opens a RequestMetrics for each request. SQL is timed by an
+# execute wrapper installed on every database connection; auth, serialization and rendering
+# are timed by phase() blocks at those call sites. When the request finishes the numbers go
+# out as a Server-Timing header, into the per-endpoint aggregates served at /metrics
+# (Prometheus text format), and to the 'recipes.slow' logger, with the SQL, if it was slow.
+
+logger = logging.getLogger('recipes.slow')
+
+# Latency histogram bucket bounds, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ('auth', 'db', 'serialize', 'render')
+MAX_LOGGED_QUERIES = 50
+
+_current = contextvars.ContextVar('recipes_request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.active = set()
+        self.query_count = 0
+        self.queries = []
+
+    def add_query(self, sql, duration):
+        self.query_count += 1
+        self.phases['db'] += duration
+        if len(self.queries) < MAX_LOGGED_QUERIES:
+            self.queries.append((sql, duration))
+
+    def server_timing(self, total):
+        entries = [f'total;dur={total * 1000:.1f}']
+        for name in PHASES:
+            if name in self.phases:
+                entry = f'{name};dur={self.phases[name] * 1000:.1f}'
+                if name == 'db':
+                    entry += f';desc="{self.query_count} queries"'
+                entries.append(entry)
+        return ', '.join(entries)
+
+
+@contextmanager
+def request_metrics():
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """
+    Adds the time spent in the block to the current request's `name` phase. Nested blocks of
+    the same phase (a serializer inside a serializer) are only counted once.
+    """
+    metrics = _current.get()
+    if metrics is None or name in metrics.active:
+        yield
+        return
+    metrics.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.active.discard(name)
+        metrics.phases[name] += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper (see connection_created in signals.py) that times every query run
+    while a request is being instrumented.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - started)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with phase('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+def finish(request, response, metrics):
+    """
+    Records a finished request: Server-Timing header, aggregates and the slow request log.
+    """
+    total = time.perf_counter() - metrics.started
+    if getattr(settings, 'RECIPES_SERVER_TIMING', True):
+        response['Server-Timing'] = metrics.server_timing(total)
+    size = None if response.streaming else len(response.content)
+    endpoint = endpoint_name(request)
+    registry.observe(endpoint, request.method, response.status_code, total, metrics, size)
+
+    threshold = getattr(settings, 'RECIPES_SLOW_REQUEST_MS', 500)
+    if threshold and total * 1000 >= threshold:
+        lines = [f'  {duration * 1000:8.1f} ms  {sql}' for sql, duration in metrics.queries]
+        if metrics.query_count > len(metrics.queries):
+            lines.append(f'  ... {metrics.query_count - len(metrics.queries)} more')
+        logger.warning(
+            'Slow request: %s %s -> %s in %.1f ms (%s)\n%s',
+            request.method, request.get_full_path(), response.status_code, total * 1000,
+            metrics.server_timing(total), '\n'.join(lines),
+        )
+
+
+class MetricsRegistry:
+    """
+    Per-process aggregates per endpoint and method, rendered in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)  # (endpoint, method, status) -> count
+            self.histograms = {}  # (endpoint, method) -> [bucket counts..., sum, count]
+            self.phase_seconds = defaultdict(float)  # (endpoint, phase) -> seconds
+            self.queries = defaultdict(int)  # endpoint -> count
+            self.response_bytes = defaultdict(int)  # endpoint -> bytes
+
+    def observe(self, endpoint, method, status, duration, metrics, size):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            histogram = self.histograms.setdefault((endpoint, method), [0] * (len(BUCKETS) + 2))
+            histogram[bisect.bisect_left(BUCKETS, duration)] += 1
+            histogram[-2] += duration
+            histogram[-1] += 1
+            for name, seconds in metrics.phases.items():
+                self.phase_seconds[(endpoint, name)] += seconds
+            self.queries[endpoint] += metrics.query_count
+            if size is not None:
+                self.response_bytes[endpoint] += size
+
+    def render(self):
+        with self._lock:
+            lines = [
+                '# HELP recipes_http_requests_total Requests served, by endpoint, method and status.',
+                '# TYPE recipes_http_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'recipes_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+            lines += [
+                '# HELP recipes_http_request_duration_seconds Request latency, by endpoint and method.',
+                '# TYPE recipes_http_request_duration_seconds histogram',
+            ]
+            for (endpoint, method), histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, '+Inf'), histogram):
+                    cumulative += count
+                    labels = _labels(endpoint=endpoint, method=method, le=bound)
+                    lines.append(f'recipes_http_request_duration_seconds_bucket{labels} {cumulative}')
+                labels = _labels(endpoint=endpoint, method=method)
+                lines.append(f'recipes_http_request_duration_seconds_sum{labels} {histogram[-2]:.6f}')
+                lines.append(f'recipes_http_request_duration_seconds_count{labels} {histogram[-1]}')
+
+            lines += [
+                '# HELP recipes_http_phase_seconds_total Time spent per request phase (auth, db, serialize, render).',
+                '# TYPE recipes_http_phase_seconds_total counter',
+            ]
+            for (endpoint, name), seconds in sorted(self.phase_seconds.items()):
+                lines.append(f'recipes_http_phase_seconds_total{_labels(endpoint=endpoint, phase=name)} {seconds:.6f}')
+
+            lines += [
+                '# HELP recipes_db_queries_total SQL queries run while serving requests.',
+                '# TYPE recipes_db_queries_total counter',
+            ]
+            for endpoint, count in sorted(self.queries.items()):
+                lines.append(f'recipes_db_queries_total{_labels(endpoint=endpoint)} {count}')
+
+            lines += [
+                '# HELP recipes_http_response_bytes_total Response body bytes (streamed responses excluded).',
+                '# TYPE recipes_http_response_bytes_total counter',
+            ]
+            for endpoint, size in sorted(self.response_bytes.items()):
+                lines.append(f'recipes_http_response_bytes_total{_labels(endpoint=endpoint)} {size}')
+
+        cache_stats = cache.stats.as_dict()
+        lines += [
+            '# HELP recipes_cache_requests_total Response cache lookups, by result.',
+            '# TYPE recipes_cache_requests_total counter',
+            f'recipes_cache_requests_total{_labels(result="hit")} {cache_stats["hits"]}',
+            f'recipes_cache_requests_total{_labels(result="miss")} {cache_stats["misses"]}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+
+registry = MetricsRegistry()
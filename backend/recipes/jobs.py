@@ -0,0 +1,272 @@
+import datetime
+import io
+import logging
+import os
+import signal
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Background jobs for long operations: imports, search index rebuilds and seeding.
+#
+# The Job table is the whole queue, so no broker is needed. A request (or a command with
+# --background) enqueues a job and returns at once; `manage.py run_workers` claims due jobs
+# and runs them in a pool of processes. A claim is one conditional UPDATE (queued -> running),
+# so two workers never take the same job.
+#
+# Handlers work through a job in chunks, one short transaction each, and write a checkpoint
+# (progress, plus whatever they need to resume in Job.result) inside the chunk's transaction,
+# so the checkpoint and the work it records commit together. A failed job is queued again
+# after RECIPES_JOBS_RETRY_DELAY seconds, doubled for every attempt made, until it runs out of
+# attempts; the retry resumes from the last checkpoint. Workers renew the lease of the jobs
+# they run every poll; a running job whose lease has not been renewed for RECIPES_JOBS_LEASE
+# seconds lost its worker, and is queued again. Should its old worker turn out to be alive,
+# its next checkpoint finds the job gone and rolls its chunk back.
+#
+# Model imports are local: worker processes import this module before setting Django up.
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}  # kind -> (handler, max attempts)
+
+
+class Lost(Exception):
+    """
+    The job was taken from this worker (its lease ran out) while it was running.
+    """
+
+
+def handler(kind, max_attempts=3):
+    """
+    Registers a function of a Job as the handler for jobs of `kind`. It returns the job's
+    result, or None to keep the one it checkpointed.
+    """
+    def register(func):
+        HANDLERS[kind] = (func, max_attempts)
+        return func
+    return register
+
+
+def lease_seconds():
+    return getattr(settings, 'RECIPES_JOBS_LEASE', 300)
+
+
+def enqueue(kind, restaurant_id=None, payload=None, input='', total=0):
+    from .models import Job
+
+    _, max_attempts = HANDLERS[kind]
+    return Job.objects.create(
+        kind=kind, restaurant_id=restaurant_id, payload=payload or {}, input=input, total=total,
+        max_attempts=max_attempts,
+    )
+
+
+def _owned(job):
+    # The job as long as it is still this run's: running, on this worker, on this attempt.
+    from .models import Job
+
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker, attempts=job.attempts)
+
+
+def checkpoint(job, progress, result=None, total=None):
+    """
+    Records the job's progress (and result so far) and renews its lease. Call it inside the
+    transaction of the chunk it records. Raises Lost if the job is no longer this run's.
+    """
+    fields = {'progress': progress, 'heartbeat_at': timezone.now()}
+    if result is not None:
+        fields['result'] = result
+    if total is not None:
+        fields['total'] = total
+    if not _owned(job).update(**fields):
+        raise Lost()
+    for name, value in fields.items():
+        setattr(job, name, value)
+
+
+def claim(worker, limit=1):
+    """
+    Takes up to `limit` due jobs, oldest first, for `worker`. Returns their ids.
+    """
+    from .models import Job
+
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by('run_after', 'pk')
+    claimed = []
+    for pk in due.values_list('pk', flat=True)[:limit]:
+        # Another worker may have claimed it since the SELECT: then this updates nothing.
+        if Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, attempts=F('attempts') + 1, started_at=now, heartbeat_at=now,
+        ):
+            claimed.append(pk)
+    return claimed
+
+
+def renew(worker, job_ids):
+    """
+    Renews the lease of `worker`'s running jobs.
+    """
+    from .models import Job
+
+    Job.objects.filter(pk__in=job_ids, status=Job.RUNNING, worker=worker).update(heartbeat_at=timezone.now())
+
+
+def requeue_abandoned():
+    """
+    Queues running jobs whose lease ran out again (or fails them, when that was their last
+    attempt). Returns the number of jobs requeued and failed.
+    """
+    from .models import Job
+
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now - datetime.timedelta(seconds=lease_seconds()))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error='The worker running this job stopped responding.', worker='', finished_at=now,
+    )
+    requeued = stale.update(status=Job.QUEUED, worker='', run_after=now)
+    return requeued, failed
+
+
+def run_job(job_id):
+    """
+    Runs a claimed job: it ends succeeded, failed, or queued for a retry. Returns its status.
+    """
+    from .models import Job
+    from .routers import request_scope
+
+    close_old_connections()
+    # Scoped like a request that has written (the claim): the job reads its own row, and
+    # everything after, from the primary rather than a replica that may not have seen the
+    # claim yet. The pin ends with the job, not with the process.
+    try:
+        with request_scope(pinned=True):
+            return _run(Job.objects.get(pk=job_id))
+    finally:
+        close_old_connections()
+
+
+def _run(job):
+    from .models import Job
+
+    if job.kind not in HANDLERS:
+        return _failed(job, f'Unknown job kind: {job.kind}', retry=False)
+    func, _ = HANDLERS[job.kind]
+    try:
+        result = func(job)
+    except Lost:
+        logger.warning('Job %s (%s) was taken from worker %s.', job.pk, job.kind, job.worker)
+        return Job.QUEUED
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed.', job.pk, job.kind)
+        return _failed(job, f'{type(exc).__name__}: {exc}')
+    fields = {'status': Job.SUCCEEDED, 'error': '', 'finished_at': timezone.now()}
+    if result is not None:
+        fields['result'] = result
+    _owned(job).update(**fields)
+    return Job.SUCCEEDED
+
+
+def _failed(job, error, retry=True):
+    from .models import Job
+
+    now = timezone.now()
+    if retry and job.attempts < job.max_attempts:
+        delay = getattr(settings, 'RECIPES_JOBS_RETRY_DELAY', 30) * 2 ** (job.attempts - 1)
+        _owned(job).update(
+            status=Job.QUEUED, error=error, worker='', run_after=now + datetime.timedelta(seconds=delay),
+        )
+        return Job.QUEUED
+    _owned(job).update(status=Job.FAILED, error=error, finished_at=now)
+    return Job.FAILED
+
+
+def init_worker():
+    """
+    Sets Django up in a freshly spawned worker process. Ctrl-C is left to the parent, which
+    lets running jobs finish.
+    """
+    import django
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    django.setup()
+
+
+@handler('import_recipes')
+def import_recipes(job):
+    """
+    Imports the job's NDJSON input into its restaurant, a batch per transaction. The
+    checkpoint is the last line read, with the summary so far.
+    """
+    from .bulk import BATCH_SIZE, RecipeImporter, iter_ndjson
+
+    class CheckpointedImporter(RecipeImporter):
+        def validate(self, number, record):
+            self.line = number
+            return super().validate(number, record)
+
+        @transaction.atomic
+        def write(self, batch):
+            super().write(batch)
+            checkpoint(job, self.line, self.summary())
+
+    importer = CheckpointedImporter(job.restaurant_id, job.payload.get('batch_size', BATCH_SIZE))
+    importer.created = job.result.get('created', 0)
+    importer.error_count = job.result.get('error_count', 0)
+    importer.errors = job.result.get('errors', [])
+    done = job.progress
+    records = iter_ndjson(io.BytesIO(job.input.encode()))
+    summary = importer.run((number, record) for number, record in records if number > done)
+    # Lines after the last batch written (invalid ones) only show up in the final summary.
+    with transaction.atomic():
+        checkpoint(job, job.total, summary)
+    return summary
+
+
+@handler('rebuild_search_index')
+def rebuild_search_index(job):
+    """
+    Rebuilds the search index a chunk at a time, checkpointing the last recipe id indexed.
+    """
+    from . import search
+    from .models import Recipe
+
+    if not job.total:
+        with transaction.atomic():
+            checkpoint(job, job.progress, total=Recipe.objects.count())
+
+    def progress(last_id, count):
+        checkpoint(job, job.progress + count, {'last_id': last_id})
+
+    search.rebuild_index(after=job.result.get('last_id', 0), progress=progress)
+    return {'indexed': job.progress}
+
+
+class HeartbeatOutput(io.StringIO):
+    """
+    Command output that renews the job's lease whenever the command reports progress.
+    """
+
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def write(self, text):
+        if not _owned(self.job).update(heartbeat_at=timezone.now()):
+            raise Lost()
+        return super().write(text)
+
+
+@handler('seed_data', max_attempts=1)
+def seed_data(job):
+    """
+    Runs seed_data with the job's options. Not retried: a reseed starts by clearing the
+    tables, so a second attempt would not resume but start over.
+    """
+    from django.core.management import call_command
+
+    output = HeartbeatOutput(job)
+    call_command('seed_data', stdout=output, **job.payload)
+    return {'output': output.getvalue().splitlines()}
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes import summaries
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the denormalized ingredient summary (names and count) of every recipe from its '
+        'ingredient lines. Migrating fills it in and writes keep it up to date; run this after writing rows '
+        'around the API (raw SQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to backfill.')
+        parser.add_argument('--chunk-size', type=int, default=summaries.CHUNK_SIZE,
+                            help='Recipes refreshed per transaction.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        count = summaries.backfill(options['database'], options['chunk_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Refreshed the ingredient summary of {count} recipes.'))
@@ -0,0 +1,56 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+from recipes.benchmarks import DEFAULT_SIZES, BenchmarkRunner, compare
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks list, retrieve, search, create and update at several dataset sizes in a throwaway '
+        'test database, writes the results as JSON and optionally fails on regressions against a baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                            help='Comma-separated recipes per restaurant, e.g. 1000,10000,100000.')
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per scenario.')
+        parser.add_argument('--seed', type=int, default=37)
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare against this JSON file (e.g. benchmarks/baseline.json).')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed slowdown / memory growth over the baseline, as a fraction.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers.')
+        if min(sizes) < 1 or options['iterations'] < 1:
+            raise CommandError('Sizes and --iterations must be at least 1.')
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Cannot read baseline: {exc}')
+
+        # Never touch the real data: run in a fresh test database, like the test runner does.
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            runner = BenchmarkRunner(sizes, options['iterations'], options['seed'], log=self.stdout.write)
+            results = runner.run()
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f"Results written to {options['output']}.")
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(regression))
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}.')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
@@ -0,0 +1,148 @@
+import asyncio
+import socket
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from backend.asgi import application
+from recipes.models import Recipe, UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the sync (/api/recipes/) and async (/api/async/recipes/) read endpoints under '
+        'concurrent load, serving the ASGI application with an in-process uvicorn worker. '
+        'Run it against a seeded database (see seed_data --restaurants).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=50, help='Clients in flight at once.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and path.')
+        parser.add_argument('--username', help="User to authenticate as (default: the first one with a restaurant).")
+        parser.add_argument('--search', default='chicken', help='Search term for the search scenario.')
+        parser.add_argument('--client-delay', type=float, default=0.0,
+                            help='Seconds each client waits between connecting and finishing its request (slow network).')
+        parser.add_argument('--with-cache', action='store_true', help='Leave the response cache on (it is off by default).')
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError('This benchmark serves the app with uvicorn: pip install uvicorn')
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency and --requests must be at least 1.')
+
+        profiles = UserProfile.objects.select_related('user').order_by('id')
+        if options['username']:
+            profiles = profiles.filter(user__username=options['username'])
+        profile = profiles.first()
+        if profile is None:
+            raise CommandError('No user linked to a restaurant; run seed_data first.')
+        recipe_id = Recipe.objects.filter(restaurant_id=profile.restaurant_id).values_list('pk', flat=True).first()
+        if recipe_id is None:
+            raise CommandError(f'{profile.user.username} has no recipes to read.')
+        self.token = str(AccessToken.for_user(profile.user))
+        self.client_delay = options['client_delay']
+
+        scenarios = [
+            ('list', ''),
+            ('search', f"?search={options['search']}"),
+            ('retrieve', f'{recipe_id}/'),
+        ]
+        # Timeout 0 makes every cache write expire at once, so each request does the real work.
+        timeout = {} if options['with_cache'] else {'RECIPES_CACHE_TIMEOUT': 0}
+        # Every request comes from one restaurant, which throttling would soon turn away.
+        with override_settings(RECIPES_THROTTLE_RATES={}, **timeout):
+            server, sock = self.start_server(uvicorn)
+            try:
+                self.stdout.write(
+                    f"{'endpoint':<10}{'path':<7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                    f"{'threads':>9}{'errors':>8}"
+                )
+                for name, suffix in scenarios:
+                    for label, prefix in (('sync', '/api/recipes/'), ('async', '/api/async/recipes/')):
+                        result = asyncio.run(self.run_scenario(
+                            sock.getsockname()[1], prefix + suffix, options['requests'], options['concurrency']
+                        ))
+                        self.stdout.write(
+                            f"{name:<10}{label:<7}{result['throughput']:>9.1f}{result['p50']:>9.1f}"
+                            f"{result['p95']:>9.1f}{result['p99']:>9.1f}{result['threads']:>9}{result['errors']:>8}"
+                        )
+            finally:
+                server.should_exit = True
+                self.server_thread.join()
+                sock.close()
+
+    def start_server(self, uvicorn):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('127.0.0.1', 0))
+        config = uvicorn.Config(application, lifespan='off', log_level='warning', backlog=4096)
+        server = uvicorn.Server(config)
+        self.server_thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+        self.server_thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        return server, sock
+
+    async def fetch(self, port, path, token=None):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            head = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token or self.token}\r\n'
+            writer.write(head.encode('ascii'))
+            if self.client_delay:
+                await writer.drain()
+                await asyncio.sleep(self.client_delay)
+            writer.write(b'Connection: close\r\n\r\n')
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        return int(response.split(b' ', 2)[1])
+
+    async def run_scenario(self, port, path, requests, concurrency):
+        for _ in range(min(5, requests)):  # warm up connections and caches
+            await self.fetch(port, path)
+
+        latencies = []
+        errors = 0
+        peak_threads = threading.active_count()
+        remaining = iter(range(requests))
+
+        async def client():
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    status = await self.fetch(port, path)
+                except (OSError, IndexError, ValueError):
+                    status = None
+                latencies.append(time.perf_counter() - started)
+                if status != 200:
+                    errors += 1
+
+        async def sample_threads():
+            nonlocal peak_threads
+            while True:
+                peak_threads = max(peak_threads, threading.active_count())
+                await asyncio.sleep(0.005)
+
+        sampler = asyncio.create_task(sample_threads())
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'throughput': len(latencies) / elapsed,
+            'p50': cuts[49] * 1000,
+            'p95': cuts[94] * 1000,
+            'p99': cuts[98] * 1000,
+            # Includes this command's own main thread and the uvicorn thread.
+            'threads': peak_threads,
+            'errors': errors,
+        }
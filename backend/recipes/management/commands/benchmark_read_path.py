@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+from recipes.benchmarks import READ_PATHS, ReadPathBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares list and detail throughput through the serializers and the stdlib JSON encoder '
+        'against the values_list()/orjson fast path, in a throwaway test database, and checks that '
+        'every configuration returns the same bytes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=10000, help='Recipes in the benchmark restaurant.')
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per scenario and configuration.')
+        parser.add_argument('--seed', type=int, default=37)
+
+    def handle(self, *args, **options):
+        if options['size'] < 1 or options['iterations'] < 1:
+            raise CommandError('--size and --iterations must be at least 1.')
+
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            benchmark = ReadPathBenchmark(options['size'], options['iterations'], options['seed'], log=self.stdout.write)
+            results = benchmark.run()
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        if not results['meta']['orjson']:
+            self.stdout.write(self.style.WARNING('orjson is not installed: the orjson rows used the stdlib encoder.'))
+        slowest = READ_PATHS[0][0]
+        for scenario, configurations in results['results'].items():
+            base = configurations[slowest]['requests_per_s']
+            for label, metrics in configurations.items():
+                if label != slowest:
+                    self.stdout.write(f"{scenario}: {label} {metrics['requests_per_s'] / base:.2f}x {slowest}")
+        if not all(metrics['identical'] for configurations in results['results'].values()
+                   for metrics in configurations.values()):
+            raise CommandError('The read paths returned different bytes.')
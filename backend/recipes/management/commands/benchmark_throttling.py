@@ -0,0 +1,199 @@
+import asyncio
+import multiprocessing
+import statistics
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from recipes import throttling
+from recipes.cache import get_cache
+from recipes.models import UserProfile
+
+from .benchmark_async_reads import Command as AsyncReadsCommand
+
+# Seconds to wait for the noisy restaurant to use up its search budget before measuring.
+SETTLE_TIMEOUT = 60
+
+
+class Command(AsyncReadsCommand):
+    help = (
+        "Load test for per-restaurant throttling: measures one restaurant's list latency on its "
+        'own, then while another restaurant floods /api/recipes/?search= at a fixed rate, with '
+        'throttling off and on. Serves the ASGI application with an in-process uvicorn worker; '
+        'the flood comes from a child process, so it does not compete with the server for the '
+        'GIL. Run it against a seeded database with at least two restaurants (see seed_data '
+        '--restaurants).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10,
+                            help="Seconds the measured restaurant's requests are timed for, per phase.")
+        parser.add_argument('--concurrency', type=int, default=4, help="The measured restaurant's clients in flight.")
+        parser.add_argument('--page-size', type=int, default=50,
+                            help='Page size of the measured list requests (0: the whole list).')
+        parser.add_argument('--burst-rate', type=float, default=50, help="The noisy restaurant's searches per second.")
+        parser.add_argument('--burst-concurrency', type=int, default=50,
+                            help="Most of the noisy restaurant's requests in flight at once.")
+        parser.add_argument('--search', default='chicken', help='Search term the noisy restaurant sends.')
+        parser.add_argument('--async-views', action='store_true',
+                            help='Use /api/async/recipes/ instead of /api/recipes/.')
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError('This benchmark serves the app with uvicorn: pip install uvicorn')
+        if min(options['concurrency'], options['burst_concurrency']) < 1:
+            raise CommandError('--concurrency and --burst-concurrency must be at least 1.')
+        if min(options['duration'], options['burst_rate']) <= 0:
+            raise CommandError('--duration and --burst-rate must be above 0.')
+
+        profiles = []
+        for profile in UserProfile.objects.select_related('user').order_by('id'):
+            if all(profile.restaurant_id != other.restaurant_id for other in profiles):
+                profiles.append(profile)
+            if len(profiles) == 2:
+                break
+        if len(profiles) < 2:
+            raise CommandError('Needs users from two restaurants; run seed_data --restaurants 2 first.')
+        self.restaurant_ids = [profile.restaurant_id for profile in profiles]
+        self.client_delay = 0
+
+        prefix = '/api/async/recipes/' if options['async_views'] else '/api/recipes/'
+        burst_path = f"{prefix}?{urlencode({'search': options['search']})}"
+        list_path = f"{prefix}?page_size={options['page_size']}" if options['page_size'] else prefix
+        phases = [
+            ('alone', None, {}),
+            ('burst, unthrottled', burst_path, {'RECIPES_THROTTLE_RATES': {}}),
+            ('burst, throttled', burst_path, {}),
+        ]
+        # Forked before the server thread starts, so the child holds no copy of its locks.
+        context = multiprocessing.get_context('fork')
+        self.burst, child = context.Pipe()
+        burster = context.Process(target=self.burst_worker, args=(child,), daemon=True)
+        burster.start()
+        # Timeout 0 makes every cache write expire at once, so each request does the real work.
+        # The burst is slow on purpose; keep it out of the slow request log.
+        with override_settings(RECIPES_CACHE_TIMEOUT=0, RECIPES_SLOW_REQUEST_MS=0):
+            server, sock = self.start_server(uvicorn)
+            try:
+                self.stdout.write(
+                    f"{'phase':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+                    f"{'burst req/s':>13}{'burst 429s':>12}"
+                )
+                for label, path, overrides in phases:
+                    # Fresh tokens each phase: an unthrottled burst can outlast their lifetime.
+                    self.token, burst_token = (str(AccessToken.for_user(profile.user)) for profile in profiles)
+                    self.reset_buckets()
+                    with override_settings(**overrides):
+                        result = asyncio.run(self.run_phase(
+                            sock.getsockname()[1], list_path, options['duration'], options['concurrency'],
+                            path and (path, burst_token, options['burst_rate'], options['burst_concurrency']),
+                        ))
+                    self.stdout.write(
+                        f"{label:<20}{result['p50']:>9.1f}{result['p95']:>9.1f}{result['p99']:>9.1f}"
+                        f"{result['errors']:>8}{result['burst_throughput']:>13.1f}{result['throttled']:>12}"
+                    )
+            finally:
+                self.burst.send(None)
+                burster.join()
+                server.should_exit = True
+                self.server_thread.join()
+                sock.close()
+
+    def reset_buckets(self):
+        get_cache().delete_many([
+            throttling.bucket_key(restaurant_id, scope)
+            for restaurant_id in self.restaurant_ids for scope in throttling.SCOPES
+        ])
+
+    def burst_worker(self, connection):
+        """
+        The child process: sends each burst it is given until told to stop, reporting
+        'throttled' at the first 429 and then the burst's totals.
+        """
+        while (burst := connection.recv()) is not None:
+            connection.send(asyncio.run(self.flood(connection, *burst)))
+
+    async def flood(self, connection, port, path, token, rate, concurrency):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        loop.add_reader(connection.fileno(), stop.set)
+        in_flight = set()
+        requests = throttled = 0
+
+        async def request():
+            nonlocal throttled
+            try:
+                status = await self.fetch(port, path, token)
+            except (OSError, IndexError, ValueError):
+                status = None
+            if status == 429:
+                if not throttled:
+                    connection.send('throttled')
+                throttled += 1
+
+        # Open loop: requests go out at `rate` per second whatever happens to earlier ones,
+        # like a script would send them, up to `concurrency` at a time.
+        started = next_at = loop.time()
+        while not stop.is_set():
+            if len(in_flight) < concurrency:
+                task = asyncio.create_task(request())
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                requests += 1
+            next_at += 1 / rate
+            await asyncio.sleep(max(0, next_at - loop.time()))
+        elapsed = loop.time() - started
+        # Let the server finish the burst, so none of it spills into the next phase.
+        await asyncio.gather(*in_flight)
+        connection.recv()  # the stop message
+        return {'requests': requests, 'throttled': throttled, 'elapsed': elapsed}
+
+    async def run_phase(self, port, path, duration, concurrency, burst=None):
+        for _ in range(5):  # warm up connections and caches
+            await self.fetch(port, path)
+
+        if burst:
+            self.burst.send((port, *burst))
+            # Measure the sustained burst: once its budget is used up, when it has one.
+            if settings.RECIPES_THROTTLE_RATES:
+                await asyncio.to_thread(self.burst.poll, SETTLE_TIMEOUT)
+            else:
+                await asyncio.sleep(1)
+
+        latencies = []
+        errors = 0
+        until = time.perf_counter() + duration
+
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < until:
+                started = time.perf_counter()
+                try:
+                    status = await self.fetch(port, path)
+                except (OSError, IndexError, ValueError):
+                    status = None
+                latencies.append(time.perf_counter() - started)
+                if status != 200:
+                    errors += 1
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+        totals = {'requests': 0, 'throttled': 0, 'elapsed': 1}
+        if burst:
+            self.burst.send('stop')
+            while not isinstance(totals := self.burst.recv(), dict):
+                pass  # the 'throttled' notice
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'p50': cuts[49] * 1000,
+            'p95': cuts[94] * 1000,
+            'p99': cuts[98] * 1000,
+            'errors': errors,
+            'burst_throughput': totals['requests'] / totals['elapsed'],
+            'throttled': totals['throttled'],
+        }
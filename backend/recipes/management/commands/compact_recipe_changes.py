@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes import changes
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacts the recipe change log behind /api/recipes/changes/: drops changes superseded by a '
+        'later change to the same recipe, old tombstones, and the log of deleted restaurants.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to compact.')
+        parser.add_argument('--tombstone-days', type=int, default=changes.TOMBSTONE_DAYS,
+                            help='Keep deletes this many days; clients that last synced before are told to resync.')
+        parser.add_argument('--chunk-size', type=int, default=changes.CHUNK_SIZE,
+                            help='Log rows read and deleted at a time.')
+
+    def handle(self, *args, **options):
+        if options['tombstone_days'] < 0:
+            raise CommandError('--tombstone-days cannot be negative.')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        removed = changes.compact(
+            options['database'], options['tombstone_days'], options['chunk_size'], log=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} recipe changes.'))
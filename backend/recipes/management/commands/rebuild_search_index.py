@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes import jobs, search
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index for every recipe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild.')
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the rebuild (of the default database) as a job for run_workers.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if search.search_vendor(using) is None:
+            self.stdout.write(self.style.WARNING('This database engine has no full-text index; nothing to do.'))
+            return
+        if options['background']:
+            if using != 'default':
+                raise CommandError('--background rebuilds the default database only.')
+            job = jobs.enqueue('rebuild_search_index')
+            self.stdout.write(self.style.SUCCESS(f'Queued job {job.pk}; run_workers will pick it up.'))
+            return
+        count = search.rebuild_index(using)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} recipes.'))
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from recipes import jobs
+
+# Seconds between looks for jobs whose worker died (see jobs.requeue_abandoned).
+REAP_INTERVAL = 30
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs queued background jobs (imports, search index rebuilds, seeding) until stopped, in a '
+        'pool of worker processes. The database is the queue: start as many of these as you like, '
+        'on any host that reaches it. SIGINT/SIGTERM lets running jobs finish, then exits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Jobs run at once, each in its own process (0: one at a time, in this process).')
+        parser.add_argument('--poll-interval', type=float, default=1,
+                            help='Seconds between looks at the queue while there is nothing to do.')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue has no due jobs left.')
+
+    def handle(self, *args, **options):
+        processes, poll_interval = options['processes'], options['poll_interval']
+        if processes < 0 or poll_interval <= 0:
+            raise CommandError('--processes must be at least 0 and --poll-interval above 0.')
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+
+        pool = self.make_pool(processes)
+        running = {}  # future -> job id
+        reap_at = 0
+        self.stdout.write(f'Worker {self.worker} waiting for jobs ({processes or "no"} processes).')
+        try:
+            while not self.stopping or running:
+                close_old_connections()
+                if time.monotonic() >= reap_at:
+                    jobs.requeue_abandoned()
+                    reap_at = time.monotonic() + REAP_INTERVAL
+                if running:
+                    jobs.renew(self.worker, list(running.values()))
+                claimed = []
+                if not self.stopping:
+                    claimed = jobs.claim(self.worker, max(processes - len(running), 0) if pool else 1)
+                for job_id in claimed:
+                    self.stdout.write(f'Job {job_id} started.')
+                    if pool:
+                        running[pool.submit(jobs.run_job, job_id)] = job_id
+                    else:
+                        self.report(job_id, jobs.run_job(job_id))
+                if running:
+                    done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    broken = False
+                    for future in done:
+                        job_id = running.pop(future)
+                        try:
+                            self.report(job_id, future.result())
+                        except BrokenProcessPool:
+                            # Its process died (e.g. killed for memory): once the lease runs out,
+                            # the job is queued again.
+                            self.stdout.write(self.style.ERROR(f'Job {job_id} lost its process.'))
+                            broken = True
+                    if broken:
+                        pool.shutdown(wait=False)
+                        pool = self.make_pool(processes)
+                elif not claimed:
+                    if options['burst']:
+                        break
+                    time.sleep(poll_interval)
+        finally:
+            if pool:
+                pool.shutdown()
+            for signum, previous in handlers.items():
+                signal.signal(signum, previous)
+
+    def make_pool(self, processes):
+        if not processes:
+            return None
+        # Spawned rather than forked: a child starts with no copy of this process's connections.
+        return ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context('spawn'), initializer=jobs.init_worker,
+        )
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            raise KeyboardInterrupt()
+        self.stopping = True
+        self.stdout.write('Stopping once running jobs finish (again to stop now).')
+
+    def report(self, job_id, status):
+        style = self.style.SUCCESS if status == 'succeeded' else self.style.WARNING
+        self.stdout.write(style(f'Job {job_id} {status}.'))
@@ -1,18 +1,107 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from django.contrib.auth.models import User
-from recipes.models import Restaurant, UserProfile, Ingredient, Recipe, RecipeIngredient
+from recipes import autocomplete, cache, jobs, search
+from recipes.cache import get_cache
+from recipes.models import Restaurant, UserProfile, Ingredient, Recipe, RecipeChange, RecipeIngredient
+from recipes.synthetic import SyntheticDataGenerator
+
+# The options a background job is run with (the rest are Django's own).
+SEED_OPTIONS = (
+    'restaurants', 'recipes_per_restaurant', 'ingredients', 'min_lines', 'max_lines', 'seed', 'chunk_size', 'append',
+    'skip_index',
+)
 
 class Command(BaseCommand):
-    help = 'Seeds the database with sample data for restaurants, users, and recipes.'
+    help = (
+        'Seeds the database with sample data for restaurants, users, and recipes. '
+        'Without --restaurants it loads the small hand-written fixture; with it, it generates synthetic data at scale.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, help='Generate this many synthetic restaurants (one user each).')
+        parser.add_argument('--recipes-per-restaurant', type=int, default=100)
+        parser.add_argument('--ingredients', type=int, default=1000, help='Size of the ingredient vocabulary.')
+        parser.add_argument('--min-lines', type=int, default=5, help='Minimum ingredient lines per recipe.')
+        parser.add_argument('--max-lines', type=int, default=15, help='Maximum ingredient lines per recipe.')
+        parser.add_argument('--seed', type=int, default=37, help='Random seed; the same arguments give the same data.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert / transaction.')
+        parser.add_argument('--append', action='store_true', help='Keep existing data instead of clearing it first.')
+        parser.add_argument('--skip-index', action='store_true', help="Don't build the search index afterwards.")
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the seeding as a job for run_workers instead of running it here.')
 
-    @transaction.atomic
     def handle(self, *args, **options):
+        if options['restaurants'] is not None:
+            self.check_options(options)
+        if options['background']:
+            payload = {name: options[name] for name in SEED_OPTIONS if options[name] is not None}
+            job = jobs.enqueue('seed_data', payload=payload)
+            self.stdout.write(self.style.SUCCESS(f'Queued job {job.pk}; run_workers will pick it up.'))
+            return
+        if options['restaurants'] is None:
+            self.seed_fixture()
+        else:
+            self.seed_synthetic(options)
+
+    def check_options(self, options):
+        if options['restaurants'] < 1 or options['recipes_per_restaurant'] < 0:
+            raise CommandError('--restaurants must be at least 1 and --recipes-per-restaurant at least 0.')
+        if not 0 < options['min_lines'] <= options['max_lines']:
+            raise CommandError('Need 0 < --min-lines <= --max-lines.')
+        if options['max_lines'] > options['ingredients']:
+            raise CommandError('--max-lines cannot exceed the --ingredients vocabulary size.')
+
+    def seed_synthetic(self, options):
+        started = time.perf_counter()
+        if not options['append']:
+            self.stdout.write("Deleting old data...")
+            # Superusers survive, so the admin login keeps working after a reseed.
+            self.clear_tables(User.objects.filter(is_superuser=False))
+
+        generator = SyntheticDataGenerator(
+            restaurants=options['restaurants'],
+            recipes_per_restaurant=options['recipes_per_restaurant'],
+            ingredients=options['ingredients'],
+            lines_per_recipe=(options['min_lines'], options['max_lines']),
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            log=self.stdout.write,
+        )
+        counts = generator.run()
+        if not options['skip_index']:
+            self.stdout.write("Building search index...")
+            search.rebuild_index()
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Successfully seeded the database: {summary} in {elapsed:.1f}s.'))
+
+    def clear_tables(self, users):
+        # Plain DELETEs rather than QuerySet.delete(): with 100k+ rows, collecting every object
+        # to send per-row signals takes far longer than the load itself. What those signals would
+        # have kept in sync is reset here instead: the search index and change log are emptied
+        # (each restaurant's sequence goes with it), the restaurants' cached responses are
+        # invalidated and the autocomplete index is rebuilt from scratch once this commits.
+        models = [RecipeChange, RecipeIngredient, Recipe, Ingredient, UserProfile, Restaurant]
+        restaurant_ids = list(Restaurant.objects.values_list('pk', flat=True))
+        with transaction.atomic(), connection.cursor() as cursor:
+            for m in models:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(m._meta.db_table)}')
+            if search.search_vendor() is not None:
+                cursor.execute(f'DELETE FROM {search.SEARCH_TABLE}')
+            users.delete()
+            for restaurant_id in restaurant_ids:
+                cache.invalidate_restaurant(restaurant_id)
+            transaction.on_commit(autocomplete.index.clear)
+        get_cache().clear()
+
+    @transaction.atomic
+    def seed_fixture(self):
         self.stdout.write("Deleting old data...")
         # Clear existing data to prevent duplicates
-        models = [RecipeIngredient, Recipe, Ingredient, UserProfile, Restaurant, User]
-        for m in models:
-            m.objects.all().delete()
+        self.clear_tables(User.objects.all())
 
         self.stdout.write("Creating new data...")
 
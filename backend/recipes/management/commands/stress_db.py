@@ -0,0 +1,94 @@
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from recipes.models import Recipe, Restaurant
+from recipes.serializers import RecipeDetailSerializer
+
+# Ingredient names shared by every thread, so concurrent writers also race to create them.
+INGREDIENTS = ['Flour', 'Water', 'Salt', 'Yeast', 'Olive Oil', 'Tomatoes', 'Mozzarella', 'Basil', 'Garlic', 'Onion']
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammers the configured database with concurrent recipe writes and reads from several threads '
+        'and reports any that failed (e.g. "database is locked"). Works in a scratch restaurant that is '
+        'deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=50, help='Recipes each thread creates and updates.')
+
+    def handle(self, *args, **options):
+        threads, writes = options['threads'], options['writes']
+        if threads < 1 or writes < 1:
+            raise CommandError('--threads and --writes must be at least 1.')
+
+        self.restaurant = Restaurant.objects.create(name='Stress test')
+        self.errors = Counter()
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.barrier = threading.Barrier(threads)
+        workers = [threading.Thread(target=self.worker, args=(n, writes)) for n in range(threads)]
+        started = time.perf_counter()
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            Recipe.objects.filter(restaurant=self.restaurant).delete()
+            self.restaurant.delete()
+
+        operations = len(self.latencies)
+        cuts = statistics.quantiles(self.latencies, n=100) if operations > 1 else self.latencies * 99
+        self.stdout.write(
+            f'{operations} write transactions from {threads} threads in {elapsed:.2f}s '
+            f'({operations / elapsed:.0f}/s), p50 {cuts[49] * 1000:.1f} ms, p99 {cuts[98] * 1000:.1f} ms.'
+        )
+        failed = sum(self.errors.values())
+        for message, count in self.errors.most_common():
+            self.stdout.write(self.style.ERROR(f'{count} x {message}'))
+        if failed:
+            raise CommandError(f'{failed} of {operations} operations failed.')
+        self.stdout.write(self.style.SUCCESS('No operations failed.'))
+
+    def worker(self, number, writes):
+        try:
+            self.barrier.wait()
+            for i in range(writes):
+                started = time.perf_counter()
+                try:
+                    self.write(number, i)
+                except OperationalError as exc:
+                    with self.lock:
+                        self.errors[str(exc)] += 1
+                with self.lock:
+                    self.latencies.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+
+    def write(self, number, i):
+        payload = {
+            'title': f'Stress {number}-{i}',
+            'instructions': 'Mix. Rest. Bake.',
+            'yield_amount': '1 loaf',
+            'ingredients': [
+                {'name': name, 'quantity': 1 + (number + i + n) % 50, 'unit': 'g'} for n, name in enumerate(INGREDIENTS)
+            ],
+        }
+        serializer = RecipeDetailSerializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+        recipe = serializer.save(restaurant_id=self.restaurant.pk)
+
+        # Read while the other threads write, then update what was just created.
+        list(Recipe.objects.filter(restaurant_id=self.restaurant.pk).values_list('pk', flat=True)[:20])
+        payload['ingredients'][0]['quantity'] = 99
+        serializer = RecipeDetailSerializer(recipe, data=payload)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
@@ -0,0 +1,44 @@
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from . import instrumentation, routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    """
+    Scopes read-replica pinning to one request. Requests that may write are pinned to
+    the primary from the start, so none of their reads can see a lagging replica.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with routers.request_scope(pinned=request.method not in SAFE_METHODS):
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with routers.request_scope(pinned=request.method not in SAFE_METHODS):
+                return get_response(request)
+    return middleware
+
+
+@sync_and_async_middleware
+def instrumentation_middleware(get_response):
+    """
+    Times every request (see recipes/instrumentation.py): adds a Server-Timing header,
+    feeds /metrics and logs slow requests.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with instrumentation.request_metrics() as metrics:
+                response = await get_response(request)
+                instrumentation.finish(request, response, metrics)
+            return response
+    else:
+        def middleware(request):
+            with instrumentation.request_metrics() as metrics:
+                response = get_response(request)
+                instrumentation.finish(request, response, metrics)
+            return response
+    return middleware
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['restaurant', '-updated_at', '-id'], name='recipe_restaurant_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'recipes_recipe_search'
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            "title, instructions, ingredients, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE TABLE {SEARCH_TABLE} ("
+            "recipe_id bigint PRIMARY KEY REFERENCES recipes_recipe (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(f"CREATE INDEX {SEARCH_TABLE}_document_gin ON {SEARCH_TABLE} USING GIN (document)")
+    else:
+        return
+
+    # Index the recipes that already exist.
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    db = schema_editor.connection.alias
+    for recipe_id, title, instructions in Recipe.objects.using(db).values_list('id', 'title', 'instructions'):
+        names = ' '.join(
+            RecipeIngredient.objects.using(db).filter(recipe_id=recipe_id).values_list('ingredient__name', flat=True)
+        )
+        if vendor == 'sqlite':
+            schema_editor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, instructions, ingredients) VALUES (%s, %s, %s, %s)",
+                [recipe_id, title, instructions, names],
+            )
+        else:
+            schema_editor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (recipe_id, document) VALUES (%s, "
+                "setweight(to_tsvector('english', %s), 'A') || setweight(to_tsvector('english', %s), 'B') "
+                "|| setweight(to_tsvector('english', %s), 'C'))",
+                [recipe_id, title, names, instructions],
+            )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_recipe_restaurant_updated_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
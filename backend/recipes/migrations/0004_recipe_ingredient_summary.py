@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:24
+
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    # The same helper as the backfill_ingredient_summaries command, on the historical models.
+    from recipes import summaries
+
+    summaries.backfill(schema_editor.connection.alias, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_names',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
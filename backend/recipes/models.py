@@ -1,9 +1,14 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 # A simple model for multi-tenancy. Each user belongs to a restaurant.
 class Restaurant(models.Model):
     name = models.CharField(max_length=255, unique=True)
+    # Sequence of the restaurant's change feed (see changes.py): the last number handed out to
+    # a RecipeChange, and the highest one compaction has dropped a tombstone at.
+    change_seq = models.PositiveBigIntegerField(default=0, editable=False)
+    change_floor = models.PositiveBigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -32,6 +37,15 @@ class Recipe(models.Model):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='recipes')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized from the ingredient lines (see summaries.py); kept up to date by signals, never edited directly.
+    ingredient_names = models.TextField(blank=True, default='', editable=False)
+    ingredient_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Backs the keyset pagination cursor: (restaurant, updated_at, id), newest first.
+            models.Index(fields=['restaurant', '-updated_at', '-id'], name='recipe_restaurant_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -49,3 +63,62 @@ class RecipeIngredient(models.Model):
     def __str__(self):
         return f"{self.quantity} {self.unit} of {self.ingredient.name}"
 
+
+# One row per recipe write, for the delta sync feed (see changes.py). The recipe is a plain
+# id rather than a foreign key, so a delete leaves its row behind as a tombstone; rows of
+# deleted restaurants are left for compact_recipe_changes to remove.
+class RecipeChange(models.Model):
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    seq = models.PositiveBigIntegerField()
+    recipe_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Also the index the feed reads through: (restaurant, seq > token) in order.
+            models.UniqueConstraint(fields=['restaurant', 'seq'], name='recipe_change_restaurant_seq_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{'Deleted' if self.deleted else 'Changed'} recipe {self.recipe_id} (#{self.seq})"
+
+
+# A long operation (an import, a reindex, a seed) queued for `manage.py run_workers` (see
+# jobs.py). The restaurant is a plain id, like RecipeChange's, so reseeding the tables never
+# trips over the job history; restaurant-less jobs are maintenance jobs.
+class Job(models.Model):
+    QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    # The handler's arguments, and the data it works through (an uploaded NDJSON body).
+    payload = models.JSONField(default=dict, blank=True)
+    input = models.TextField(blank=True, default='', editable=False)
+    # The summary so far; handlers also keep their checkpoint here, so a retry resumes.
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True, default='')
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Who runs it, and when it last showed signs of life: the lease a stalled run loses.
+    worker = models.CharField(max_length=100, blank=True, default='')
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # What workers poll: queued jobs that are due, oldest first.
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
@@ -0,0 +1,128 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# Keyset pagination over the composite (updated_at, id) key, or (search_rank, updated_at, id)
+# for a ?search= list, so its pages keep the relevance order.
+# Unlike offset pagination, each page is a range scan that starts right after the
+# last row of the previous page, so page N costs the same as page 1. The cursor also
+# carries the page size, so a `next` link works with or without ?page_size=.
+class RecipeCursorPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request, cursor=None):
+        """
+        Pagination is opt-in: clients that don't send ?page_size= (or a cursor
+        carrying one) keep getting the plain list they always have.
+        """
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            page_size = cursor['page_size'] if cursor else 0
+        if page_size <= 0:
+            return None
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        """
+        The cursor as {'updated_at', 'pk', 'page_size', 'rank'}, where 'rank' is None for
+        a cursor into an unranked list; None without a cursor.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            cursor = {
+                'updated_at': parse_datetime(tokens['u'][0]),
+                'pk': int(tokens['i'][0]),
+                'page_size': int(tokens['p'][0]) if 'p' in tokens else 0,
+                'rank': float(tokens['r'][0]) if 'r' in tokens else None,
+            }
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor['updated_at'] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, obj):
+        tokens = {'u': obj.updated_at.isoformat(), 'i': obj.pk, 'p': self.page_size}
+        if self.ranked:
+            tokens['r'] = repr(obj.search_rank)  # repr() round-trips a float exactly.
+        encoded = b64encode(parse.urlencode(tokens).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    def get_page_queryset(self, queryset, request):
+        """
+        The unevaluated queryset for the requested page (plus one look-ahead row), or None
+        when the request isn't paginated. Split out so the async views can await it.
+        """
+        cursor = self.decode_cursor(request)
+        self.page_size = self.get_page_size(request, cursor)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        # A search (see search.search_queryset) pages in order of relevance first.
+        self.ranked = 'search_rank' in queryset.query.annotations
+        if self.ranked:
+            queryset = queryset.order_by(F('search_rank').desc(nulls_last=True), '-updated_at', '-id')
+        else:
+            queryset = queryset.order_by('-updated_at', '-id')
+
+        if cursor is not None:
+            if self.ranked != (cursor['rank'] is not None):
+                raise NotFound(self.invalid_cursor_message)  # A cursor into another list.
+            updated_at, pk = cursor['updated_at'], cursor['pk']
+            # Row-value comparison (updated_at, id) < (cursor.updated_at, cursor.id)
+            after = Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=pk)
+            if self.ranked:
+                # ... behind (search_rank) < (cursor.rank)
+                after = Q(search_rank__lt=cursor['rank']) | (Q(search_rank=cursor['rank']) & after)
+            queryset = queryset.filter(after)
+
+        # Fetch one extra row to find out whether there is a next page.
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.page = results[:self.page_size]
+        self.has_next = len(results) > self.page_size
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,39 @@
+from django.conf import settings
+
+from .instrumentation import TimedJSONRenderer, phase
+
+try:
+    import orjson
+except ImportError:  # Optional: without it every response goes through the stdlib encoder.
+    orjson = None
+
+# JSON rendering with orjson, byte-for-byte compatible with DRF's JSONRenderer.
+#
+# DRF renders compact, unescaped UTF-8 JSON with U+2028 and U+2029 escaped; orjson
+# produces exactly that (after the same two replacements) several times faster. Anything
+# orjson doesn't encode natively, datetimes included, is handed to DRF's own encoder so
+# it is formatted the same way. Requests for indented or ASCII-only output, and data
+# orjson rejects, fall back to the stdlib renderer.
+
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson is not None else 0
+
+
+def orjson_enabled():
+    return orjson is not None and getattr(settings, 'RECIPES_ORJSON', True)
+
+
+class FastJSONRenderer(TimedJSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if (
+            data is None or not orjson_enabled() or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        with phase('render'):
+            try:
+                rendered = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+            except orjson.JSONEncodeError:
+                return super().render(data, accepted_media_type, renderer_context)
+            # Same as JSONRenderer: keep the output a valid JavaScript string literal too.
+            return rendered.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,101 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .cache import get_cache
+
+# Read-replica routing.
+#
+# Writes always go to the primary ('default'); reads go to a random replica from
+# settings.DATABASE_REPLICAS. A read stays on the primary when it could otherwise miss
+# a write the client expects to see:
+#   * in a request that writes (unsafe method, or any write so far in the request),
+#   * inside a transaction,
+#   * for RECIPES_REPLICA_LAG seconds after a write to the same restaurant, so a client
+#     that saves and then reloads doesn't see its change "disappear" while replicas catch up.
+# Pinning is scoped per request by replica_routing_middleware, and per job by jobs.run_job.
+# Outside a scope (management commands, the shell) nothing is pinned: a pin there would never
+# be lifted, and a long-lived process would read from the primary for good after one write.
+
+_pinned = contextvars.ContextVar('recipes_pinned_to_primary', default=None)  # None: no scope
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def get_lag():
+    return getattr(settings, 'RECIPES_REPLICA_LAG', 5)
+
+
+def pin_to_primary():
+    if _pinned.get() is not None:
+        _pinned.set(True)
+
+
+@contextmanager
+def request_scope(pinned=False):
+    token = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def _written_key(restaurant_id):
+    return f'recipes:written:{restaurant_id}'
+
+
+def record_write(restaurant_id):
+    """
+    Opens the lag window for a restaurant. Set now and again on commit, so the window
+    always runs from the moment the write became visible on the primary.
+    """
+    lag = get_lag()
+    if restaurant_id is None or not lag or not get_replicas():
+        return
+    get_cache().set(_written_key(restaurant_id), True, timeout=lag)
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        transaction.on_commit(lambda: get_cache().set(_written_key(restaurant_id), True, timeout=lag))
+
+
+def pin_after_recent_write(restaurant_id):
+    if restaurant_id is not None and get_replicas() and get_cache().get(_written_key(restaurant_id)):
+        pin_to_primary()
+
+
+async def apin_after_recent_write(restaurant_id):
+    if restaurant_id is not None and get_replicas() and await get_cache().aget(_written_key(restaurant_id)):
+        pin_to_primary()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from wherever their parent was read.
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Everything the rest of this request reads must see this write.
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication.
+        if db in get_replicas():
+            return False
+        return None
@@ -0,0 +1,204 @@
+import re
+
+from django.db import connections, transaction
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+from .summaries import split_names
+
+# Full-text search over recipe title, instructions and ingredient names.
+#
+# The index lives in a side table keyed by recipe id (see migration 0003):
+#   - SQLite:     an FTS5 virtual table, rowid = recipe id, ranked with bm25().
+#   - PostgreSQL: a tsvector column with a GIN index, ranked with ts_rank().
+# Any other engine falls back to the old icontains search.
+SEARCH_TABLE = 'recipes_recipe_search'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_vendor(using='default'):
+    vendor = connections[using].vendor
+    return vendor if vendor in ('sqlite', 'postgresql') else None
+
+
+def tokenize(term):
+    return TOKEN_RE.findall(term or '')
+
+
+INDEX_CHUNK_SIZE = 500
+
+
+def build_documents(recipe_ids, using='default'):
+    """
+    Returns {recipe id: (title, instructions, ingredient names)} for the recipes that still
+    exist, in one query: the names come from the denormalized summary, not a join.
+    """
+    from .models import Recipe
+
+    recipes = Recipe.objects.using(using).filter(pk__in=recipe_ids)
+    return {
+        pk: (title, instructions, ' '.join(split_names(names)))
+        for pk, title, instructions, names in recipes.values_list('pk', 'title', 'instructions', 'ingredient_names')
+    }
+
+
+def index_recipes(recipe_ids, using='default'):
+    """
+    (Re)builds the search documents for many recipes with a constant number of queries
+    per chunk. Ids of recipes that no longer exist are dropped from the index.
+    """
+    vendor = search_vendor(using)
+    if vendor is None:
+        return
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), INDEX_CHUNK_SIZE):
+        chunk = recipe_ids[start:start + INDEX_CHUNK_SIZE]
+        documents = build_documents(chunk, using)
+        placeholders = ', '.join(['%s'] * len(chunk))
+        with connections[using].cursor() as cursor:
+            if vendor == 'sqlite':
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', chunk)
+                if documents:
+                    cursor.executemany(
+                        f'INSERT INTO {SEARCH_TABLE} (rowid, title, instructions, ingredients) VALUES (%s, %s, %s, %s)',
+                        [(pk, title, instructions, names) for pk, (title, instructions, names) in documents.items()],
+                    )
+            else:
+                missing = [pk for pk in chunk if pk not in documents]
+                if missing:
+                    cursor.execute(
+                        f'DELETE FROM {SEARCH_TABLE} WHERE recipe_id IN ({", ".join(["%s"] * len(missing))})', missing
+                    )
+                if documents:
+                    cursor.executemany(
+                        f"""
+                        INSERT INTO {SEARCH_TABLE} (recipe_id, document)
+                        VALUES (%s, setweight(to_tsvector('english', %s), 'A')
+                                 || setweight(to_tsvector('english', %s), 'B')
+                                 || setweight(to_tsvector('english', %s), 'C'))
+                        ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document
+                        """,
+                        [(pk, title, names, instructions) for pk, (title, instructions, names) in documents.items()],
+                    )
+
+
+def index_recipe(recipe_id, using='default'):
+    """
+    (Re)builds the search document for one recipe.
+    """
+    index_recipes([recipe_id], using)
+
+
+def remove_recipe(recipe_id, using='default'):
+    vendor = search_vendor(using)
+    if vendor is None:
+        return
+    column = 'rowid' if vendor == 'sqlite' else 'recipe_id'
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE {column} = %s', [recipe_id])
+
+
+def rebuild_index(using='default', after=0, progress=None):
+    """
+    Rebuilds every search document, one transaction per INDEX_CHUNK_SIZE recipes (in id
+    order, starting after recipe id `after`), so writers never wait on the whole rebuild.
+    Documents of recipes that no longer exist are dropped at the end. `progress(last id,
+    count)` is called inside each chunk's transaction, so a checkpoint it writes commits with
+    the chunk. Returns the number of recipes indexed.
+    """
+    from .models import Recipe
+
+    vendor = search_vendor(using)
+    if vendor is None:
+        return 0
+    recipes = Recipe.objects.using(using).order_by('pk').values_list('pk', flat=True)
+    count = 0
+    while chunk := list(recipes.filter(pk__gt=after)[:INDEX_CHUNK_SIZE]):
+        with transaction.atomic(using=using):
+            index_recipes(chunk, using)
+            after = chunk[-1]
+            count += len(chunk)
+            if progress is not None:
+                progress(after, len(chunk))
+    column = 'rowid' if vendor == 'sqlite' else 'recipe_id'
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE {column} NOT IN (SELECT id FROM {Recipe._meta.db_table})'
+        )
+    return count
+
+
+def search_queryset(queryset, term):
+    """
+    Filters a Recipe queryset down to full-text matches for `term`, annotated with
+    `search_rank` (higher is better).
+    """
+    tokens = tokenize(term)
+    if not tokens:
+        return queryset
+
+    vendor = search_vendor(queryset.db)
+    table = queryset.model._meta.db_table
+    if vendor == 'sqlite':
+        # Every token is a prefix query so results update as the user types; tokens are ANDed.
+        match = ' '.join('"%s"*' % t.replace('"', '""') for t in tokens)
+        queryset = queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match])
+        )
+        # bm25() is lower-is-better; negate so both engines rank descending.
+        rank = RawSQL(
+            f'SELECT -bm25({SEARCH_TABLE}, 10.0, 1.0, 5.0) FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = "{table}"."id"',
+            [match],
+            output_field=FloatField(),
+        )
+    elif vendor == 'postgresql':
+        tsquery = ' & '.join(f'{t}:*' for t in tokens)
+        queryset = queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT recipe_id FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('english', %s)", [tsquery]
+            )
+        )
+        rank = RawSQL(
+            f"SELECT ts_rank(document, to_tsquery('english', %s)) FROM {SEARCH_TABLE} "
+            f'WHERE recipe_id = "{table}"."id"',
+            [tsquery],
+            output_field=FloatField(),
+        )
+    else:
+        # Ingredient names are denormalized onto the recipe, so this needs no join and no DISTINCT.
+        for token in tokens:
+            queryset = queryset.filter(Q(title__icontains=token) | Q(ingredient_names__icontains=token))
+        return queryset
+
+    return queryset.annotate(search_rank=rank).order_by(F('search_rank').desc(nulls_last=True), '-updated_at', '-id')
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """
+    Drop-in replacement for DRF's SearchFilter backed by the full-text index.
+    Matches are ordered by relevance, paginated or not.
+    """
+    search_param = 'search'
+
+    def get_search_term(self, request):
+        return request.query_params.get(self.search_param, '').replace('\x00', '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        term = self.get_search_term(request)
+        if not term:
+            return queryset
+        return search_queryset(queryset, term)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Full-text search over title, instructions and ingredient names.',
+                'schema': {'type': 'string'},
+            },
+        ]
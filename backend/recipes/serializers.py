@@ -1,7 +1,63 @@
+from collections import Counter
+from decimal import Decimal
 from rest_framework import serializers
-from .models import Recipe, Ingredient, RecipeIngredient, Restaurant, UserProfile
+from .models import Job, Recipe, Ingredient, RecipeIngredient, Restaurant, UserProfile
 from django.contrib.auth.models import User
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from . import autocomplete
+from .instrumentation import phase
+from .shopping import MAX_RECIPES
+from .signals import batched_recipe_changes
+from .summaries import PREVIEW_SIZE, split_names
+
+
+def ingredient_lines_prefetch():
+    """
+    Prefetch for a recipe's ingredient lines with their Ingredient joined in, so that
+    serializing N lines costs one query instead of N + 1.
+    """
+    return Prefetch(
+        'ingredients',
+        queryset=RecipeIngredient.objects.select_related('ingredient').order_by('id'),
+    )
+
+
+def resolve_ingredient_ids(names):
+    """
+    Maps ingredient names to ids, creating any that don't exist yet.
+    Costs one SELECT, plus one INSERT and one SELECT when something is missing.
+    """
+    names = set(names)
+    if not names:
+        return {}
+    ids = dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - ids.keys()
+    if missing:
+        # ignore_conflicts covers a concurrent request creating the same name first;
+        # it also means the new ids aren't returned, so read them back.
+        Ingredient.objects.bulk_create([Ingredient(name=name) for name in missing], ignore_conflicts=True)
+        created = dict(Ingredient.objects.filter(name__in=missing).values_list('name', 'id'))
+        ids.update(created)
+        # bulk_create() sends no post_save, so tell the autocomplete index directly.
+        autocomplete.index.add_on_commit((pk, name) for name, pk in created.items())
+    return ids
+
+
+class TimedDataMixin:
+    """
+    Counts building `.data` towards the request's 'serialize' phase (Server-Timing, /metrics).
+    """
+
+    @property
+    def data(self):
+        with phase('serialize'):
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
 
 # Serializer for the Ingredient model
 class IngredientSerializer(serializers.ModelSerializer):
@@ -12,65 +68,172 @@ class IngredientSerializer(serializers.ModelSerializer):
 # Serializer for the RecipeIngredient "through" model
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     name = serializers.CharField(source='ingredient.name')
+    # PATCH only: {"name": ..., "delete": true} removes that line from the recipe.
+    delete = serializers.BooleanField(required=False, default=False, write_only=True)
 
     class Meta:
         model = RecipeIngredient
-        fields = ['name', 'quantity', 'unit']
+        fields = ['name', 'quantity', 'unit', 'delete']
 
 # Serializer for the main Recipe model (for detail view)
-class RecipeDetailSerializer(serializers.ModelSerializer):
+class RecipeDetailSerializer(TimedDataMixin, serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(many=True)
 
     class Meta:
         model = Recipe
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'title', 'instructions', 'yield_amount', 'ingredients', 'updated_at']
-    
+
+    def to_representation(self, instance):
+        # No-op when the view already prefetched the lines.
+        prefetch_related_objects([instance], ingredient_lines_prefetch())
+        return super().to_representation(instance)
+
+    def validate_ingredients(self, value):
+        if any('ingredient' not in item for item in value):
+            raise serializers.ValidationError("Every ingredient line needs a name.")
+        counts = Counter(item['ingredient']['name'] for item in value)
+        duplicates = sorted(name for name, count in counts.items() if count > 1)
+        if duplicates:
+            raise serializers.ValidationError(f"Duplicate ingredients: {', '.join(duplicates)}")
+
+        # On PATCH lines may omit quantity/unit, but only when they change an existing line.
+        if self.partial and self.instance is not None:
+            prefetch_related_objects([self.instance], ingredient_lines_prefetch())
+            existing = {line.ingredient.name for line in self.instance.ingredients.all()}
+            for item in value:
+                name = item['ingredient']['name']
+                if item.get('delete') or name in existing:
+                    continue
+                if 'quantity' not in item or 'unit' not in item:
+                    raise serializers.ValidationError(f"New ingredient '{name}' needs a quantity and a unit.")
+        return value
+
     # We need to handle the creation of nested ingredients
     @transaction.atomic
     def create(self, validated_data):
-        ingredients_data = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        for ingredient_data in ingredients_data:
-            ingredient_name = ingredient_data['ingredient']['name']
-            ingredient, _ = Ingredient.objects.get_or_create(name=ingredient_name)
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredient=ingredient,
-                quantity=ingredient_data['quantity'],
-                unit=ingredient_data['unit']
-            )
+        ingredients_data = [item for item in validated_data.pop('ingredients') if not item.get('delete')]
+        # bulk_create() sends no signals; the recipe's own post_save reindexes it and
+        # invalidates the cache once on leaving the block, after the ingredient rows are in place.
+        with batched_recipe_changes():
+            recipe = Recipe.objects.create(**validated_data)
+            self._create_ingredients(recipe, ingredients_data)
         return recipe
 
     # We also need to handle updates for nested ingredients
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', None)
-        
-        # Update the recipe instance fields
-        instance.title = validated_data.get('title', instance.title)
-        instance.instructions = validated_data.get('instructions', instance.instructions)
-        instance.yield_amount = validated_data.get('yield_amount', instance.yield_amount)
-        instance.save()
-
-        # Handle nested ingredients update
-        if ingredients_data is not None:
-            # Clear old ingredients
-            instance.ingredients.all().delete()
-            # Create new ones
-            for ingredient_data in ingredients_data:
-                ingredient_name = ingredient_data['ingredient']['name']
-                ingredient, _ = Ingredient.objects.get_or_create(name=ingredient_name)
-                RecipeIngredient.objects.create(
-                    recipe=instance,
-                    ingredient=ingredient,
-                    quantity=ingredient_data['quantity'],
-                    unit=ingredient_data['unit']
-                )
+
+        with batched_recipe_changes():
+            # Update the recipe instance fields
+            instance.title = validated_data.get('title', instance.title)
+            instance.instructions = validated_data.get('instructions', instance.instructions)
+            instance.yield_amount = validated_data.get('yield_amount', instance.yield_amount)
+            instance.save()
+
+            # Handle nested ingredients update
+            if ingredients_data is not None:
+                self._apply_ingredient_changes(instance, ingredients_data, replace=not self.partial)
+                # Drop the now stale prefetched lines so the response reflects the changes.
+                getattr(instance, '_prefetched_objects_cache', {}).pop('ingredients', None)
         return instance
 
+    def _apply_ingredient_changes(self, recipe, ingredients_data, replace):
+        """
+        Diffs the submitted lines against the stored ones (keyed by ingredient name) and
+        writes only the inserts, updates and deletes that are needed.
+
+        With replace=True (PUT) lines missing from the payload are deleted; otherwise (PATCH)
+        they are left alone and only lines flagged "delete" are removed.
+        """
+        prefetch_related_objects([recipe], ingredient_lines_prefetch())
+        existing = {line.ingredient.name: line for line in recipe.ingredients.all()}
+
+        to_insert, to_update, to_delete = [], [], []
+        submitted = set()
+        for item in ingredients_data:
+            name = item['ingredient']['name']
+            line = existing.get(name)
+            if item.get('delete'):
+                if line is not None:
+                    to_delete.append(line.pk)
+                continue
+            submitted.add(name)
+            if line is None:
+                to_insert.append(item)
+                continue
+            changed = False
+            for field in ('quantity', 'unit'):
+                if field in item and getattr(line, field) != item[field]:
+                    setattr(line, field, item[field])
+                    changed = True
+            if changed:
+                to_update.append(line)
+
+        if replace:
+            to_delete.extend(line.pk for name, line in existing.items() if name not in submitted)
+
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['quantity', 'unit'])
+        if to_insert:
+            self._create_ingredients(recipe, to_insert)
+
+    def _create_ingredients(self, recipe, ingredients_data):
+        """
+        Writes all ingredient lines for a recipe with a constant number of queries.
+        """
+        ingredient_ids = resolve_ingredient_ids(item['ingredient']['name'] for item in ingredients_data)
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_ids[item['ingredient']['name']],
+                quantity=item['quantity'],
+                unit=item['unit']
+            )
+            for item in ingredients_data
+        ])
+
 
 # A simpler serializer for list view
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(TimedDataMixin, serializers.ModelSerializer):
+    # The first few ingredient names, read from the recipe row itself (no join).
+    ingredient_preview = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'title', 'yield_amount']
\ No newline at end of file
+        list_serializer_class = TimedListSerializer
+        fields = ['id', 'title', 'yield_amount', 'ingredient_count', 'ingredient_preview']
+
+    def get_ingredient_preview(self, obj):
+        return split_names(obj.ingredient_names)[:PREVIEW_SIZE]
+
+
+# Input of the shopping list endpoint: which recipes, and how many batches of each.
+class ShoppingListItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    multiplier = serializers.DecimalField(max_digits=8, decimal_places=3, min_value=Decimal('0.001'), default=Decimal(1))
+
+
+class ShoppingListSerializer(serializers.Serializer):
+    recipes = ShoppingListItemSerializer(many=True, allow_empty=False, max_length=MAX_RECIPES)
+
+    def validate_recipes(self, value):
+        # The same recipe listed twice is planned twice: add the multipliers up.
+        multipliers = {}
+        for item in value:
+            multipliers[item['id']] = multipliers.get(item['id'], 0) + item['multiplier']
+        return multipliers
+
+
+# Status of a background job (see jobs.py), polled by the client that queued it.
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'status', 'progress', 'total', 'result', 'error', 'attempts', 'max_attempts',
+            'created_at', 'started_at', 'finished_at', 'run_after',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from rest_framework import serializers
+
+from .models import RecipeIngredient
+
+# Shopping (prep) lists: total ingredient quantities over a set of recipes, each scaled by a
+# multiplier (how many batches of it are planned).
+#
+# The totals come from one grouped aggregate, SUM(quantity * multiplier) per ingredient name
+# and unit, with the multipliers inlined as a CASE over the recipe ids (one branch per
+# distinct multiplier, so the SQL grows with the number of recipes only through their ids).
+# One pass over the grouped rows then folds unit spellings together ("Cups" and "cups" are one
+# unit) and metric units into grams and millilitres, so "500 g" of flour in one recipe and
+# "1 kg" in another come out as one line.
+#
+# SQLite has no decimal type: its SUM adds floats, and totals would drift (0.1 + 0.2). There
+# the lines are fetched (still one query) and added up as Decimals in Python instead.
+
+MAX_RECIPES = 500
+
+# Unit spelling (lowercased) -> (base unit, factor to the base unit). Other units are kept,
+# lowercased, and only lines with the same unit are added up.
+UNIT_CONVERSIONS = {
+    **dict.fromkeys(('mg', 'milligram', 'milligrams'), ('g', Decimal('0.001'))),
+    **dict.fromkeys(('g', 'gram', 'grams', 'gr'), ('g', Decimal(1))),
+    **dict.fromkeys(('kg', 'kilogram', 'kilograms', 'kilo', 'kilos'), ('g', Decimal(1000))),
+    **dict.fromkeys(('ml', 'milliliter', 'milliliters', 'millilitre', 'millilitres'), ('ml', Decimal(1))),
+    **dict.fromkeys(('cl', 'centiliter', 'centiliters', 'centilitre', 'centilitres'), ('ml', Decimal(10))),
+    **dict.fromkeys(('dl', 'deciliter', 'deciliters', 'decilitre', 'decilitres'), ('ml', Decimal(100))),
+    **dict.fromkeys(('l', 'liter', 'liters', 'litre', 'litres'), ('ml', Decimal(1000))),
+}
+
+_quantity = RecipeIngredient._meta.get_field('quantity')
+QUANTITY_FIELD = serializers.DecimalField(max_digits=None, decimal_places=_quantity.decimal_places)
+
+
+def grouped_totals(restaurant_id, multipliers):
+    """
+    (ingredient name, unit, total) rows for {recipe id: multiplier}, in one query.
+    """
+    by_multiplier = {}
+    for recipe_id, multiplier in multipliers.items():
+        by_multiplier.setdefault(multiplier, []).append(recipe_id)
+    output_field = DecimalField(max_digits=None, decimal_places=None)
+    multiplier = Case(
+        *(When(recipe_id__in=ids, then=Value(value)) for value, ids in by_multiplier.items()),
+        output_field=output_field,
+    )
+    lines = RecipeIngredient.objects.filter(recipe__restaurant_id=restaurant_id, recipe_id__in=list(multipliers))
+    if connections[lines.db].vendor == 'sqlite':
+        totals = {}
+        for name, unit, recipe_id, quantity in lines.values_list('ingredient__name', 'unit', 'recipe_id', 'quantity'):
+            totals[(name, unit)] = totals.get((name, unit), 0) + quantity * multipliers[recipe_id]
+        return [(name, unit, total) for (name, unit), total in totals.items()]
+    return (
+        lines.values_list('ingredient__name', 'unit')
+        .annotate(total=Sum(F('quantity') * multiplier, output_field=output_field))
+        .order_by()
+    )
+
+
+def shopping_list(restaurant_id, multipliers):
+    """
+    The shopping list for {recipe id: multiplier} as [{'name', 'unit', 'quantity'}], sorted
+    by ingredient name and unit.
+    """
+    totals = {}
+    for name, unit, total in grouped_totals(restaurant_id, multipliers):
+        unit = unit.strip().lower()
+        base_unit, factor = UNIT_CONVERSIONS.get(unit, (unit, 1))
+        totals[(name, base_unit)] = totals.get((name, base_unit), 0) + Decimal(total) * factor
+    return [
+        {'name': name, 'unit': unit, 'quantity': QUANTITY_FIELD.to_representation(quantity)}
+        for (name, unit), quantity in sorted(totals.items(), key=lambda item: (item[0][0].casefold(), item[0][1]))
+    ]
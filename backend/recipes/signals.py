@@ -0,0 +1,155 @@
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete, cache, changes as change_log, events, instrumentation, routers, search, summaries
+from .authentication import user_cache
+from .models import Ingredient, Recipe, RecipeIngredient, UserProfile
+
+# Keeps the ingredient summaries, the full-text search index, the change log, the event stream
+# and the response cache in sync with recipe and ingredient writes.
+#
+# Every write that changes what a recipe looks like ends up in recipe_changed(). Outside a
+# batch the follow-up work runs immediately; inside batched_recipe_changes() it is collected
+# and runs once per recipe and once per restaurant when the block exits.
+
+_batch = threading.local()
+
+
+@contextmanager
+def batched_recipe_changes():
+    """
+    Defers summary refreshes, reindexing, change logging and cache invalidation to the end of
+    the block, so writing N ingredient rows costs one of each instead of N.
+    """
+    if getattr(_batch, 'changes', None) is not None:
+        # Nested: the outermost block flushes.
+        yield
+        return
+    _batch.changes, _batch.kinds, _batch.touched = {}, {}, set()
+    try:
+        yield
+        changes, kinds, touched = _batch.changes, _batch.kinds, _batch.touched
+    finally:
+        _batch.changes = _batch.kinds = _batch.touched = None
+    _flush(changes, kinds, touched)
+
+
+def recipe_changed(recipe_id, using, restaurant_id=None, kind=events.UPDATED, touched=False):
+    """
+    Records a write to a recipe. `kind` is events.CREATED or events.DELETED when the write
+    created or deleted the recipe itself; `touched` when it already moved the recipe's
+    updated_at (a save of the recipe row). Otherwise updated_at is moved on flush, so the
+    recipe's ETag and Last-Modified change along with its payload.
+    """
+    changes = getattr(_batch, 'changes', None)
+    key = (recipe_id, using)
+    if changes is None:
+        _flush({key: restaurant_id}, {} if kind == events.UPDATED else {key: kind}, {key} if touched else ())
+        return
+    if touched:
+        _batch.touched.add(key)
+    if changes.get(key) is None:
+        changes[key] = restaurant_id
+    # A delete outranks everything else in the batch, a create outranks updates.
+    if kind == events.DELETED or (kind == events.CREATED and key not in _batch.kinds):
+        _batch.kinds[key] = kind
+
+
+def _flush(changes, kinds=None, touched=()):
+    # Resolve restaurants we weren't told about in one query per database.
+    unresolved = {}
+    for (recipe_id, using), restaurant_id in changes.items():
+        if restaurant_id is None:
+            unresolved.setdefault(using, []).append(recipe_id)
+    for using, recipe_ids in unresolved.items():
+        recipes = Recipe.objects.using(using).filter(pk__in=recipe_ids)
+        for recipe_id, restaurant_id in recipes.values_list('pk', 'restaurant_id').iterator():
+            changes[(recipe_id, using)] = restaurant_id
+
+    by_database = {}
+    for recipe_id, using in changes:
+        by_database.setdefault(using, []).append(recipe_id)
+    for using, recipe_ids in by_database.items():
+        db_kinds = {recipe_id: kind for (recipe_id, alias), kind in (kinds or {}).items() if alias == using}
+        # Ingredient lines written on their own: the recipe row wasn't saved, but its payload changed.
+        stale = [pk for pk in recipe_ids if pk not in db_kinds and (pk, using) not in touched]
+        if stale:
+            Recipe.objects.using(using).filter(pk__in=stale).update(updated_at=timezone.now())
+        # Summaries first: the search documents are built from them.
+        summaries.refresh_ingredient_summaries(recipe_ids, using)
+        search.index_recipes(recipe_ids, using)
+        logged = change_log.record(
+            {recipe_id: changes[(recipe_id, using)] for recipe_id in recipe_ids},
+            {recipe_id for recipe_id, kind in db_kinds.items() if kind == events.DELETED},
+            using,
+        )
+        events.hub.publish_on_commit(logged, db_kinds, using)
+    for restaurant_id in set(changes.values()):
+        cache.invalidate_restaurant(restaurant_id)
+        routers.record_write(restaurant_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_saved_or_deleted(sender, instance, using, signal, created=False, **kwargs):
+    if signal is post_delete:
+        kind = events.DELETED
+    else:
+        kind = events.CREATED if created else events.UPDATED
+    recipe_changed(instance.pk, using, instance.restaurant_id, kind, touched=True)
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_saved_or_deleted(sender, instance, using, origin=None, **kwargs):
+    # When the whole recipe is being deleted, the recipe handler covers it.
+    if isinstance(origin, Recipe):
+        return
+    restaurant_id = instance.recipe.restaurant_id if RecipeIngredient.recipe.is_cached(instance) else None
+    recipe_changed(instance.recipe_id, using, restaurant_id)
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, using, **kwargs):
+    # A brand new ingredient isn't used by any recipe yet.
+    if created:
+        return
+    recipes = Recipe.objects.using(using).filter(ingredients__ingredient=instance)
+    affected = list(recipes.values_list('pk', 'restaurant_id').distinct())
+    if not affected:
+        return
+    # The rename changes these recipes' payloads, so move their updated_at (and ETags) along.
+    Recipe.objects.using(using).filter(pk__in=[pk for pk, _ in affected]).update(updated_at=timezone.now())
+    with batched_recipe_changes():
+        for recipe_id, restaurant_id in affected:
+            recipe_changed(recipe_id, using, restaurant_id, touched=True)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, using, **kwargs):
+    autocomplete.index.add_on_commit([(instance.pk, instance.name)], using)
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, using, **kwargs):
+    autocomplete.index.discard_on_commit(instance.pk, using)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    user_cache.discard(instance.pk)
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def user_profile_changed(sender, instance, **kwargs):
+    user_cache.discard(instance.user_id)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # The wrapper list outlives reconnects, so only add it once per connection object.
+    if instrumentation.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(instrumentation.record_query)
@@ -0,0 +1,65 @@
+from django.db import transaction
+
+# Denormalized ingredient summary on Recipe.
+#
+# Recipe.ingredient_names holds the recipe's ingredient names in line order, one per line,
+# and Recipe.ingredient_count how many there are. They let the list show an ingredient preview
+# and the search index read a recipe's ingredients without joining through RecipeIngredient.
+# They are refreshed from the lines in signals._flush, in the same transaction as every
+# write that goes through recipe_changed(): serializers, admin inlines and bulk imports.
+# Migration 0004 fills them in for the recipes that existed before; backfill_ingredient_summaries
+# re-syncs rows written around the signals (raw SQL).
+
+SEPARATOR = '\n'
+PREVIEW_SIZE = 5
+CHUNK_SIZE = 500
+
+
+def join_names(names):
+    return SEPARATOR.join(names)
+
+
+def split_names(ingredient_names):
+    return ingredient_names.split(SEPARATOR) if ingredient_names else []
+
+
+def _models(apps):
+    # Migrations pass their historical app registry; everything else uses the current models.
+    if apps is None:
+        from .models import Recipe, RecipeIngredient
+
+        return Recipe, RecipeIngredient
+    return apps.get_model('recipes', 'Recipe'), apps.get_model('recipes', 'RecipeIngredient')
+
+
+def refresh_ingredient_summaries(recipe_ids, using='default', apps=None):
+    """
+    Recomputes the summary of each recipe from its lines: one SELECT and one UPDATE per chunk.
+    """
+    Recipe, RecipeIngredient = _models(apps)
+
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        chunk = recipe_ids[start:start + CHUNK_SIZE]
+        names = {pk: [] for pk in chunk}
+        lines = RecipeIngredient.objects.using(using).filter(recipe_id__in=chunk).order_by('id')
+        for recipe_id, name in lines.values_list('recipe_id', 'ingredient__name'):
+            names[recipe_id].append(name)
+        Recipe.objects.using(using).bulk_update(
+            [Recipe(pk=pk, ingredient_names=join_names(found), ingredient_count=len(found)) for pk, found in names.items()],
+            ['ingredient_names', 'ingredient_count'],
+        )
+
+
+def backfill(using='default', chunk_size=CHUNK_SIZE, log=None, apps=None):
+    """
+    Refreshes every recipe's summary, one transaction per chunk. Returns the number of recipes.
+    """
+    Recipe, _ = _models(apps)
+    log = log or (lambda message: None)
+    recipe_ids = list(Recipe.objects.using(using).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(recipe_ids), chunk_size):
+        with transaction.atomic(using=using):
+            refresh_ingredient_summaries(recipe_ids[start:start + chunk_size], using, apps)
+        log(f'  {min(start + chunk_size, len(recipe_ids))} / {len(recipe_ids)}')
+    return len(recipe_ids)
@@ -0,0 +1,175 @@
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .models import Ingredient, Recipe, RecipeIngredient, Restaurant, UserProfile
+from .summaries import join_names
+
+# Deterministic synthetic data at production scale, for load testing and benchmarks.
+#
+# Everything is drawn from one seeded random.Random, so the same arguments always
+# produce the same data. Rows are written with chunked bulk_create() calls, each chunk
+# in its own short transaction.
+
+BASE_INGREDIENTS = [
+    'Salt', 'Black Pepper', 'Olive Oil', 'Butter', 'Garlic', 'Onion', 'Sugar', 'All-Purpose Flour', 'Eggs', 'Milk',
+    'Heavy Cream', 'Lemon Juice', 'Vegetable Oil', 'Tomatoes', 'Parmesan Cheese', 'Chicken Stock', 'Water', 'Shallots',
+    'Fresh Basil', 'Fresh Parsley', 'Thyme', 'Rosemary', 'Oregano', 'Cumin', 'Paprika', 'Chili Flakes', 'Bay Leaves',
+    'Red Onion', 'Carrots', 'Celery', 'Bell Pepper', 'Zucchini', 'Eggplant', 'Mushrooms', 'Spinach', 'Kale',
+    'Potatoes', 'Sweet Potatoes', 'Cauliflower', 'Broccoli', 'Green Beans', 'Peas', 'Corn', 'Cabbage', 'Leeks',
+    'Ginger', 'Scallions', 'Cilantro', 'Mint', 'Dill', 'Soy Sauce', 'Fish Sauce', 'Rice Vinegar', 'Sesame Oil',
+    'Honey', 'Maple Syrup', 'Brown Sugar', 'Dijon Mustard', 'Mayonnaise', 'Ketchup', 'Worcestershire Sauce',
+    'Balsamic Vinegar', 'Red Wine Vinegar', 'White Wine', 'Red Wine', 'Beef Stock', 'Vegetable Stock', 'Coconut Milk',
+    'Chicken Breast', 'Chicken Thighs', 'Chicken Wings', 'Ground Beef', 'Beef Brisket', 'Pork Shoulder', 'Pork Belly',
+    'Bacon', 'Pancetta', 'Italian Sausage', 'Chorizo', 'Lamb Shoulder', 'Salmon Fillet', 'Cod Fillet', 'Shrimp',
+    'Mussels', 'Squid', 'Tofu', 'Chickpeas', 'Black Beans', 'Lentils', 'Arborio Rice', 'Jasmine Rice', 'Basmati Rice',
+    'Spaghetti', 'Penne', 'Rigatoni', 'Egg Noodles', 'Rice Noodles', 'Bread Flour', 'Active Dry Yeast',
+    'Baking Powder', 'Baking Soda', 'Breadcrumbs', 'Panko', 'Cornstarch', 'Mozzarella', 'Cheddar Cheese', 'Feta',
+    'Ricotta', 'Gruyere', 'Blue Cheese', 'Goat Cheese', 'Greek Yogurt', 'Sour Cream', 'Cream Cheese', 'Avocado',
+    'Limes', 'Oranges', 'Apples', 'Pears', 'Strawberries', 'Blueberries', 'Raspberries', 'Bananas', 'Pineapple',
+    'Mango', 'Dark Chocolate', 'Cocoa Powder', 'Vanilla Extract', 'Cinnamon', 'Nutmeg', 'Cloves', 'Cardamom',
+    'Star Anise', 'Turmeric', 'Coriander Seeds', 'Fennel Seeds', 'Mustard Seeds', 'Saffron', 'Capers', 'Olives',
+    'Anchovies', 'Pine Nuts', 'Walnuts', 'Almonds', 'Pistachios', 'Peanuts', 'Sesame Seeds', 'Tahini', 'Miso Paste',
+    'Gochujang', 'Sriracha', 'Harissa', 'Tomato Paste', 'San Marzano Tomatoes', 'Brioche Bun', 'Tortillas', 'Pita',
+]
+VARIANTS = ['Fresh', 'Dried', 'Organic', 'Smoked', 'Roasted', 'Frozen', 'Pickled', 'Chopped', 'Ground', 'Toasted']
+UNITS = ['g', 'kg', 'ml', 'l', 'tsp', 'tbsp', 'cup', 'count', 'slices', 'cloves', 'pinch']
+
+STYLES = ['Classic', 'Smoky', 'Spicy', 'Herb-Crusted', 'Slow-Cooked', 'Crispy', 'Grilled', 'Roasted', 'Braised',
+          'Pan-Seared', 'Honey-Glazed', 'Lemon', 'Garlic', 'Rustic', 'Sicilian', 'Korean', 'Mexican', 'Thai']
+MAINS = ['Chicken', 'Beef', 'Pork', 'Lamb', 'Salmon', 'Cod', 'Shrimp', 'Tofu', 'Mushroom', 'Eggplant', 'Chickpea',
+         'Lentil', 'Vegetable', 'Halloumi', 'Duck']
+DISHES = ['Tacos', 'Stew', 'Curry', 'Risotto', 'Pasta', 'Salad', 'Sandwich', 'Burger', 'Pizza', 'Skewers', 'Soup',
+          'Bowl', 'Flatbread', 'Pie', 'Casserole', 'Stir-Fry', 'Noodles', 'Gratin', 'Frittata', 'Wrap']
+STEPS = ['Prepare and measure all ingredients.', 'Preheat the oven.', 'Season generously with salt and pepper.',
+         'Sear in a hot pan until browned.', 'Simmer gently until tender.', 'Toss everything together.',
+         'Bake until golden.', 'Rest for five minutes before slicing.', 'Garnish and serve immediately.',
+         'Reduce the sauce until glossy.', 'Blend until smooth.', 'Chill before serving.']
+RESTAURANT_WORDS = ['Golden', 'Rustic', 'Blue', 'Copper', 'Little', 'Grand', 'Hidden', 'Urban', 'Old', 'Wild']
+RESTAURANT_KINDS = ['Kitchen', 'Bistro', 'Grill', 'Trattoria', 'Diner', 'Cantina', 'Tavern', 'Eatery', 'Brasserie']
+
+DEFAULT_PASSWORD = 'password123'
+
+
+def ingredient_vocabulary(size):
+    """
+    The first `size` ingredient names: the base list first, then 'Variant Base' combinations.
+    """
+    combos = (f'{variant} {base}' for variant, base in itertools.product(VARIANTS, BASE_INGREDIENTS))
+    return list(itertools.islice(itertools.chain(BASE_INGREDIENTS, combos), size))
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class SyntheticDataGenerator:
+    def __init__(self, restaurants, recipes_per_restaurant, ingredients=1000, lines_per_recipe=(5, 15),
+                 seed=37, chunk_size=5000, log=None):
+        self.restaurants = restaurants
+        self.recipes_per_restaurant = recipes_per_restaurant
+        self.vocabulary = ingredient_vocabulary(ingredients)
+        self.lines_per_recipe = lines_per_recipe
+        self.random = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.log = log or (lambda message: None)
+        # Zipf-like popularity: salt and oil show up everywhere, 'Pickled Saffron' almost never.
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(self.vocabulary))))
+
+    def run(self):
+        """
+        Writes everything and returns the number of rows created per model.
+        """
+        restaurant_ids = self.create_restaurants()
+        ingredient_ids = self.create_ingredients()
+        recipes, lines = self.create_recipes(restaurant_ids, ingredient_ids)
+        return {
+            'restaurants': len(restaurant_ids),
+            'ingredients': len(ingredient_ids),
+            'recipes': recipes,
+            'recipe_ingredients': lines,
+        }
+
+    def create_restaurants(self):
+        start = Restaurant.objects.aggregate(Max('id'))['id__max'] or 0
+        names = [
+            f'{self.random.choice(RESTAURANT_WORDS)} {self.random.choice(RESTAURANT_KINDS)} #{start + i + 1}'
+            for i in range(self.restaurants)
+        ]
+        password = make_password(DEFAULT_PASSWORD)  # hashed once, shared by every generated user
+        with transaction.atomic():
+            restaurants = Restaurant.objects.bulk_create([Restaurant(name=name) for name in names])
+            users = User.objects.bulk_create([
+                User(username=f'chef_{restaurant.pk}', password=password, first_name='Chef') for restaurant in restaurants
+            ])
+            UserProfile.objects.bulk_create([
+                UserProfile(user=user, restaurant=restaurant) for user, restaurant in zip(users, restaurants)
+            ])
+        self.log(f'Created {len(restaurants)} restaurants with one user each (password: {DEFAULT_PASSWORD}).')
+        return [restaurant.pk for restaurant in restaurants]
+
+    def create_ingredients(self):
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name) for name in self.vocabulary], ignore_conflicts=True, batch_size=self.chunk_size
+            )
+            by_name = dict(Ingredient.objects.filter(name__in=self.vocabulary).values_list('name', 'id'))
+        self.log(f'Ingredient vocabulary: {len(by_name)} names.')
+        return [by_name[name] for name in self.vocabulary]
+
+    def make_recipe(self, restaurant_id):
+        rng = self.random
+        title = f'{rng.choice(STYLES)} {rng.choice(MAINS)} {rng.choice(DISHES)}'
+        steps = rng.sample(STEPS, rng.randint(3, 6))
+        instructions = '\n'.join(f'{n}. {step}' for n, step in enumerate(steps, start=1))
+        return Recipe(
+            restaurant_id=restaurant_id,
+            title=title,
+            instructions=instructions,
+            yield_amount=f'{rng.randint(1, 12)} servings',
+        )
+
+    def make_lines(self, ingredient_ids):
+        """
+        Ingredient lines for one recipe as plain (ingredient_id, quantity, unit) rows.
+        """
+        rng = self.random
+        count = rng.randint(*self.lines_per_recipe)
+        picked = dict.fromkeys(rng.choices(ingredient_ids, cum_weights=self.cum_weights, k=count))
+        return [(ingredient_id, f'{rng.randint(1, 100000) / 100:.2f}', rng.choice(UNITS)) for ingredient_id in picked]
+
+    def insert_lines(self, rows):
+        # Ingredient lines are ~90% of the rows. Building a model instance and compiling an
+        # INSERT per row is most of bulk_create()'s cost, so write plain tuples with executemany.
+        table = connection.ops.quote_name(RecipeIngredient._meta.db_table)
+        sql = f'INSERT INTO {table} (recipe_id, ingredient_id, quantity, unit) VALUES (%s, %s, %s, %s)'
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def create_recipes(self, restaurant_ids, ingredient_ids):
+        owners = (restaurant_id for restaurant_id in restaurant_ids for _ in range(self.recipes_per_restaurant))
+        names = dict(zip(ingredient_ids, self.vocabulary))
+        total_recipes = total_lines = 0
+        for chunk in _chunks(owners, self.chunk_size):
+            recipes, lines = [], []
+            for restaurant_id in chunk:
+                recipe, recipe_lines = self.make_recipe(restaurant_id), self.make_lines(ingredient_ids)
+                # The lines are known up front, so the summary goes in with the recipe's INSERT.
+                recipe.ingredient_names = join_names(names[ingredient_id] for ingredient_id, _, _ in recipe_lines)
+                recipe.ingredient_count = len(recipe_lines)
+                recipes.append(recipe)
+                lines.append(recipe_lines)
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(recipes)
+                rows = [(recipe.pk, *line) for recipe, recipe_lines in zip(recipes, lines) for line in recipe_lines]
+                self.insert_lines(rows)
+            total_recipes += len(recipes)
+            total_lines += len(rows)
+            self.log(f'  {total_recipes} recipes, {total_lines} ingredient lines...')
+        return total_recipes, total_lines
@@ -0,0 +1,261 @@
+import json
+import math
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .authentication import RestaurantJWTAuthentication, get_restaurant_id
+from .cache import get_cache
+
+# Per-restaurant request throttling, so one tenant's runaway script cannot starve the others.
+#
+# Requests are budgeted per restaurant rather than per user (a restaurant's users share its
+# budget), in three separate buckets: 'search' for reads with ?search= (the expensive ones),
+# 'read' for other reads and 'write' for everything else. Each budget is a rate such as
+# "1200/min" in RECIPES_THROTTLE_RATES, and bursts up to the full rate are let through.
+#
+# The buckets live in the recipes cache: shared by every worker once RECIPES_CACHE_URL points
+# at Redis, per process otherwise. Each is a single integer (GCRA): the time, in microseconds,
+# at which the bucket will be full again. Taking a token is one atomic incr() by the time a
+# token takes to refill; a request that would run the bucket dry is refused and its incr()
+# undone. No lock is taken, so under
+# contention a few extra requests may get through, but none ever waits on another.
+#
+# A refused client tends to retry at once. Each process remembers whom it refused, and for
+# how long; under ASGI, EarlyRefusalApplication answers their retries with a 429 straight
+# from the token, before Django (and so the database) sees them.
+
+SCOPES = ('read', 'search', 'write')
+BUCKET_TIMEOUT = 3600
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    "<requests>/<period>" as (requests, period in seconds); the period is s, sec, m, min, h,
+    hour or d, day. None (or an empty rate) means no limit.
+    """
+    if not rate:
+        return None
+    requests, period = rate.split('/')
+    return int(requests), PERIODS[period.strip()[0]]
+
+
+class TokenBucket:
+    """
+    A bucket of `capacity` tokens that refills completely over `period` seconds.
+    """
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.interval = max(1, round(period * 1_000_000 / capacity))  # microseconds per token
+
+    def _verdict(self, full_at, now):
+        # `full_at` is the incremented value. Returns the seconds to wait (0: allowed), and
+        # the fix-up to make: 'reset' a bucket that had refilled completely (whose time is in
+        # the past), or 'refund' the token of a refused request.
+        if full_at - self.interval < now:
+            return 0, 'reset'
+        excess = full_at - now - self.capacity * self.interval
+        if excess <= 0:
+            return 0, None
+        return excess / 1_000_000, 'refund'
+
+    def consume(self, key):
+        """
+        Takes a token; returns 0, or the seconds until one will be available.
+        """
+        cache, now = get_cache(), time.time_ns() // 1000
+        try:
+            full_at = cache.incr(key, self.interval)
+        except ValueError:
+            if cache.add(key, now + self.interval, BUCKET_TIMEOUT):
+                return 0
+            full_at = cache.incr(key, self.interval)
+        wait, fix = self._verdict(full_at, now)
+        if fix == 'reset':
+            cache.set(key, now + self.interval, BUCKET_TIMEOUT)
+        elif fix == 'refund':
+            cache.decr(key, self.interval)
+        return wait
+
+    async def aconsume(self, key):
+        cache, now = get_cache(), time.time_ns() // 1000
+        try:
+            full_at = await cache.aincr(key, self.interval)
+        except ValueError:
+            if await cache.aadd(key, now + self.interval, BUCKET_TIMEOUT):
+                return 0
+            full_at = await cache.aincr(key, self.interval)
+        wait, fix = self._verdict(full_at, now)
+        if fix == 'reset':
+            await cache.aset(key, now + self.interval, BUCKET_TIMEOUT)
+        elif fix == 'refund':
+            await cache.adecr(key, self.interval)
+        return wait
+
+
+def bucket_key(tenant, scope):
+    return f'recipes:throttle:{tenant}:{scope}'
+
+
+def get_scope(method, search):
+    if method not in SAFE_METHODS:
+        return 'write'
+    return 'search' if search else 'read'
+
+
+class RecentRefusals:
+    """
+    Users refused in this process, per scope, with when their next request may get through.
+    Expired entries are pruned as new ones come in (at most once a second), and the whole
+    table is dropped should it still reach max_entries.
+    """
+    max_entries = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = {}  # (user id, scope) -> time.monotonic() deadline
+        self._prune_at = 0
+
+    def __bool__(self):
+        return bool(self._until)
+
+    def add(self, user_id, scope, wait):
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._prune_at:
+                # Rebuilt rather than changed in place, so lock-free readers never see it mid-change.
+                self._until = {key: until for key, until in self._until.items() if until > now}
+                self._prune_at = now + 1
+            if len(self._until) >= self.max_entries:
+                self._until = {}
+            self._until[(str(user_id), scope)] = now + wait
+
+    def remaining(self, user_id, scope):
+        key = (str(user_id), scope)
+        remaining = self._until.get(key, 0) - time.monotonic()
+        if remaining > 0:
+            return remaining
+        if key in self._until:
+            with self._lock:
+                if self._until.get(key, 0) <= time.monotonic():
+                    self._until.pop(key, None)
+        return 0
+
+    def clear(self):
+        with self._lock:
+            self._until = {}
+
+
+refusals = RecentRefusals()
+
+
+def refusal_wait(method, authorization, search):
+    """
+    Seconds until a request (its method, Authorization header and ?search= term) may get
+    through, if its user was refused in the same scope moments ago, else 0. Checks the token
+    only, without loading the user.
+    """
+    if not authorization:
+        return 0
+    authenticator = RestaurantJWTAuthentication()
+    try:
+        raw_token = authenticator.get_raw_token(authorization)
+        if raw_token is None:
+            return 0
+        user_id = authenticator.get_user_id(authenticator.get_validated_token(raw_token))
+    except AuthenticationFailed:
+        return 0  # Let authentication report it.
+    return refusals.remaining(user_id, get_scope(method, search))
+
+
+class EarlyRefusalApplication:
+    """
+    ASGI wrapper for the Django application (see backend/asgi.py) that answers retries from
+    recently refused users with a 429 itself. Django hands even a request it rejects at once
+    to the thread every sync view runs on (to send request_started and request_finished), so
+    a flood of retries would otherwise queue up in front of other restaurants' requests.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and refusals:
+            headers = dict(scope['headers'])
+            search = parse_qs(scope['query_string'].decode('latin-1')).get('search', [''])[0]
+            wait = refusal_wait(scope['method'], headers.get(b'authorization'), search)
+            if wait:
+                return await self.refuse(math.ceil(wait), headers.get(b'origin'), send)
+        return await self.application(scope, receive, send)
+
+    async def refuse(self, wait, origin, send):
+        body = json.dumps({'detail': Throttled(wait).detail}).encode()
+        headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'retry-after', str(wait).encode()),
+        ]
+        # The CORS headers django-cors-headers would add, so browsers can read the 429.
+        if origin and origin.decode('latin-1') in getattr(settings, 'CORS_ALLOWED_ORIGINS', ()):
+            headers += [
+                (b'access-control-allow-origin', origin),
+                (b'access-control-expose-headers', b'Retry-After'),
+                (b'vary', b'origin'),
+            ]
+        await send({'type': 'http.response.start', 'status': 429, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+class RestaurantRateThrottle(BaseThrottle):
+    """
+    Throttles authenticated requests by restaurant (users without one by user), with a
+    separate budget per scope. Refused requests get a 429 with Retry-After.
+    """
+    wait_seconds = 0
+
+    def get_bucket(self, request):
+        """
+        (scope, cache key, TokenBucket) for the request; the bucket is None when it is not
+        throttled.
+        """
+        user = request.user
+        scope = get_scope(request.method, request.query_params.get('search'))
+        if not user or not user.is_authenticated:
+            return scope, None, None
+        rate = parse_rate(getattr(settings, 'RECIPES_THROTTLE_RATES', {}).get(scope))
+        if rate is None:
+            return scope, None, None
+        restaurant_id = get_restaurant_id(request)
+        tenant = f'user-{user.pk}' if restaurant_id is None else restaurant_id
+        return scope, bucket_key(tenant, scope), TokenBucket(*rate)
+
+    def allow_request(self, request, view):
+        scope, key, bucket = self.get_bucket(request)
+        if bucket is not None:
+            self.wait_seconds = bucket.consume(key)
+        return self.settle(request, scope)
+
+    async def aallow_request(self, request, view):
+        scope, key, bucket = self.get_bucket(request)
+        if bucket is not None:
+            self.wait_seconds = await bucket.aconsume(key)
+        return self.settle(request, scope)
+
+    def settle(self, request, scope):
+        if not self.wait_seconds:
+            return True
+        refusals.add(request.user.pk, scope, self.wait_seconds)
+        return False
+
+    def wait(self):
+        # Whole seconds: DRF writes Retry-After as an integer, and 0 would invite a retry now.
+        return math.ceil(self.wait_seconds)
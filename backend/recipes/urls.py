@@ -1,12 +1,22 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
-from .views import RecipeViewSet
+from .async_views import AsyncRecipeDetailView, AsyncRecipeListView, RecipeEventStreamView
+from .views import CacheStatsView, IngredientAutocompleteView, JobViewSet, RecipeEventTicketView, RecipeViewSet
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
 router.register(r'recipes', RecipeViewSet, basename='recipe')
+router.register(r'jobs', JobViewSet, basename='job')
 
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
+    # Ahead of the router, whose recipe detail route would otherwise take 'events' for an id.
+    path('recipes/events/', RecipeEventStreamView.as_view(), name='recipe-events'),
+    path('recipes/events/ticket/', RecipeEventTicketView.as_view(), name='recipe-events-ticket'),
     path('', include(router.urls)),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('ingredients/autocomplete/', IngredientAutocompleteView.as_view(), name='ingredient-autocomplete'),
+    # Async read-only twins of the recipe list/detail endpoints, for ASGI deployments.
+    path('async/recipes/', AsyncRecipeListView.as_view(), name='recipe-async-list'),
+    re_path(r'^async/recipes/(?P<pk>[^/.]+)/$', AsyncRecipeDetailView.as_view(), name='recipe-async-detail'),
 ]
\ No newline at end of file
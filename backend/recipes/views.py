@@ -1,14 +1,35 @@
-from rest_framework import viewsets, permissions
-from rest_framework.filters import SearchFilter
-from .models import Recipe
-from .serializers import RecipeDetailSerializer, RecipeListSerializer
+import hmac
+import io
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed, PermissionDenied, ParseError, ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
+from . import (
+    autocomplete, bulk, cache, changes as change_log, conditional, events, fastpath, instrumentation, jobs, routers,
+    shopping,
+)
+from .authentication import get_restaurant_id
+from .models import Job, Recipe
+from .pagination import RecipeCursorPagination
+from .search import RecipeSearchFilter
+from .serializers import (
+    JobSerializer, RecipeDetailSerializer, RecipeListSerializer, ShoppingListSerializer, ingredient_lines_prefetch,
+)
 
 # Custom permission to only allow users to see recipes from their own restaurant.
 class IsOwnerOfRecipe(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        if hasattr(request.user, 'profile'):
-            return obj.restaurant == request.user.profile.restaurant
-        return False
+        restaurant_id = get_restaurant_id(request)
+        # Compare ids so neither restaurant row has to be loaded.
+        return restaurant_id is not None and obj.restaurant_id == restaurant_id
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """
@@ -18,8 +39,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsOwnerOfRecipe]
     
     # --- SEARCH CONFIGURATION ---
-    filter_backends = [SearchFilter]
-    search_fields = ['title', 'ingredients__ingredient__name'] # Search by recipe title or ingredient name
+    # Full-text search by recipe title, instructions or ingredient name, ranked by relevance
+    filter_backends = [RecipeSearchFilter]
+
+    # --- PAGINATION ---
+    # Opt-in keyset pagination: ?page_size=N, then follow the returned 'next' cursor.
+    pagination_class = RecipeCursorPagination
+
+    # Most recipes GET /recipes/batch/?ids= returns in one response.
+    max_batch_size = 100
+
+    # Sparse fieldset of the current read (?fields=, ?expand=); None for the default payload.
+    fields = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Right after this restaurant's own writes, read from the primary until replicas catch up.
+        routers.pin_after_recent_write(get_restaurant_id(request))
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -31,16 +67,345 @@ class RecipeViewSet(viewsets.ModelViewSet):
         This view should return a list of all the recipes
         for the currently authenticated user's restaurant.
         """
-        user = self.request.user
-        if hasattr(user, 'profile'):
-            restaurant = user.profile.restaurant
-            # The queryset is now automatically filtered by SearchFilter if a 'search' query param is present
-            return Recipe.objects.filter(restaurant=restaurant).order_by('-updated_at').distinct()
+        restaurant_id = get_restaurant_id(self.request)
+        if restaurant_id is not None:
+            # The queryset is now automatically filtered by RecipeSearchFilter if a 'search' query param is present
+            queryset = Recipe.objects.filter(restaurant_id=restaurant_id).order_by('-updated_at', '-id')
+            if self.action in ('retrieve', 'update', 'partial_update'):
+                # Detail payloads carry every ingredient line; fetch them all in one extra query.
+                queryset = queryset.prefetch_related(ingredient_lines_prefetch())
+            return queryset
         return Recipe.objects.none()
 
+    def list(self, request, *args, **kwargs):
+        # Sparse fieldsets (?fields=, ?expand=) are only ever built from rows, see fastpath.py.
+        self.fields = fastpath.requested_fields(request.query_params, fastpath.LIST_FIELDS)
+        handler = self.fast_list if fastpath.enabled() or self.fields else super().list
+        return self.conditional_response(handler, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        self.fields = fastpath.requested_fields(request.query_params, fastpath.DETAIL_FIELDS)
+        handler = self.fast_retrieve if fastpath.enabled() or self.fields else super().retrieve
+        return self.conditional_response(handler, request, *args, **kwargs)
+
+    def fast_list(self, request, *args, **kwargs):
+        """
+        ListModelMixin.list over plain rows instead of model instances and serializers.
+        """
+        fields = self.fields
+        queryset = self.filter_queryset(self.get_queryset())
+        # One database for the rows and their lines (see fastpath.detail_rows).
+        queryset = queryset.using(queryset.db)
+        expand = fastpath.wants_lines(fields, fastpath.LIST_FIELDS)
+        page = self.paginate_queryset(fastpath.list_rows(queryset, paginated=True, fields=fields))
+        if page is not None:
+            lines = fastpath.lines_by_recipe([row.pk for row in page], queryset.db) if expand else None
+            return self.get_paginated_response(fastpath.list_data(page, fields, lines))
+        rows = fastpath.list_rows(queryset, fields=fields)
+        lines = fastpath.lines_by_recipe(queryset.values('pk'), queryset.db) if expand else None
+        return Response(fastpath.list_data(rows, fields, lines))
+
+    def fast_retrieve(self, request, *args, **kwargs):
+        """
+        RetrieveModelMixin.retrieve over plain rows: same lookup, 404 and permission checks.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        rows = fastpath.detail_rows(self.filter_queryset(self.get_queryset()), self.fields)
+        row = get_object_or_404(rows, **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        lines = fastpath.line_rows(row.pk, rows.db) if fastpath.wants_lines(self.fields, fastpath.DETAIL_FIELDS) else ()
+        return Response(fastpath.detail_data(row, lines, self.fields))
+
+    def get_validators(self, restaurant_id, request, pk):
+        if pk is None:
+            return conditional.list_validators(restaurant_id, request)
+        return conditional.detail_validators(restaurant_id, pk)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """
+        Serves a read as a 304 when the client's copy is current, otherwise from the
+        per-restaurant response cache, otherwise by running it and caching the result.
+        Runs after authentication and permission checks, and the key includes the restaurant,
+        so a cached body is only ever served back to the tenant it was built for.
+        """
+        restaurant_id = get_restaurant_id(request)
+        if restaurant_id is None:
+            return handler(request, *args, **kwargs)
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+
+        validators = None
+        if conditional.has_conditional_headers(request):
+            validators = self.get_validators(restaurant_id, request, pk)
+            if validators is None:
+                # Unknown recipe: let the normal path produce the 404.
+                return handler(request, *args, **kwargs)
+            response = conditional.not_modified_response(request, validators)
+            if response is not None:
+                return response
+
+        key = cache.response_key(restaurant_id, self.action, request, pk)
+        entry = cache.get_cache().get(key)
+        if entry is not None:
+            cache.stats.record(hit=True)
+            response = Response(entry['data'])
+            response['X-Cache'] = 'HIT'
+            return conditional.set_validator_headers(response, entry['validators'])
+
+        cache.stats.record(hit=False)
+        # Validators are read before the data, so they can only ever be older than the body
+        # they describe; that costs a spurious 200 at worst, never a wrong 304.
+        if validators is None:
+            validators = self.get_validators(restaurant_id, request, pk)
+        response = handler(request, *args, **kwargs)
+        response['X-Cache'] = 'MISS'
+        if response.status_code == 200 and validators is not None:
+            cache.get_cache().set(key, {'data': response.data, 'validators': validators}, cache.get_timeout())
+            conditional.set_validator_headers(response, validators)
+        return response
+
+    def get_object(self):
+        obj = super().get_object()
+        if self.request.method in ('PUT', 'PATCH', 'DELETE'):
+            # If-Match / If-Unmodified-Since: optimistic concurrency against the row just loaded.
+            conditional.check_write_preconditions(self.request, obj)
+        return obj
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        # Hand back the new ETag so the client can chain its next If-Match.
+        recipe = self.updated_recipe
+        response['ETag'] = conditional.recipe_etag(recipe.pk, recipe.updated_at)
+        return response
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.updated_recipe = serializer.instance
+
     def perform_create(self, serializer):
         """
         Assign the user's restaurant to the recipe when it's created.
         """
-        restaurant = self.request.user.profile.restaurant
-        serializer.save(restaurant=restaurant)
+        serializer.save(restaurant_id=self.get_restaurant_id_or_403())
+
+    def get_restaurant_id_or_403(self):
+        restaurant_id = get_restaurant_id(self.request)
+        if restaurant_id is None:
+            raise PermissionDenied("Your account is not linked to a restaurant.")
+        return restaurant_id
+
+    @action(detail=False, methods=['get', 'post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        GET streams every recipe of the restaurant as NDJSON (one detail payload per line).
+        POST imports recipes from NDJSON (Content-Type: application/x-ndjson) or a JSON array,
+        in batched transactions. Invalid records are skipped and reported by line number.
+        With `Prefer: respond-async` the import is queued as a background job instead.
+        """
+        restaurant_id = self.get_restaurant_id_or_403()
+        if request.method == 'GET':
+            queryset = Recipe.objects.filter(restaurant_id=restaurant_id)
+            response = StreamingHttpResponse(bulk.export_ndjson(queryset), content_type='application/x-ndjson')
+            response['Content-Disposition'] = 'attachment; filename="recipes.ndjson"'
+            return response
+
+        if 'respond-async' in request.headers.get('Prefer', '').lower():
+            return self.queue_import(request, restaurant_id)
+        if request.content_type.split(';')[0].strip() in bulk.NDJSON_CONTENT_TYPES:
+            # Read straight off the request stream, so the body is never held in memory whole.
+            records = bulk.iter_ndjson(request.stream or io.BytesIO())
+        else:
+            if not isinstance(request.data, list):
+                raise ParseError("Expected a JSON array of recipes or an NDJSON body.")
+            records = enumerate(request.data, start=1)
+        summary = bulk.RecipeImporter(restaurant_id).run(records)
+        return Response(summary, status=status.HTTP_201_CREATED if summary['created'] else status.HTTP_400_BAD_REQUEST)
+
+    def queue_import(self, request, restaurant_id):
+        """
+        Stores the upload (as NDJSON) in an import job and answers 202 with the job's status
+        and, in Location, where to poll it.
+        """
+        if request.content_type.split(';')[0].strip() in bulk.NDJSON_CONTENT_TYPES:
+            try:
+                text = (request.stream or io.BytesIO()).read().decode('utf-8')
+            except UnicodeDecodeError:
+                raise ParseError("The NDJSON body must be UTF-8.")
+        else:
+            if not isinstance(request.data, list):
+                raise ParseError("Expected a JSON array of recipes or an NDJSON body.")
+            # One record per line, so line numbers in the job's errors match array positions.
+            text = ''.join(json.dumps(record) + '\n' for record in request.data)
+        job = jobs.enqueue('import_recipes', restaurant_id, input=text, total=len(text.splitlines()))
+        response = Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        response['Location'] = reverse('job-detail', args=[job.pk], request=request)
+        return response
+
+    @action(detail=False, methods=['get'], url_path='batch')
+    def batch(self, request):
+        """
+        Detail payloads for ?ids=1,2,3 in the order asked for, plus the ids that don't exist (or
+        belong to another restaurant). The tenant filter is applied once and all the recipes and
+        their ingredient lines are read together, in two queries. Takes ?fields= like retrieve.
+        """
+        fields = fastpath.requested_fields(request.query_params, fastpath.DETAIL_FIELDS)
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in request.query_params.get('ids', '').split(',') if pk.strip()))
+        except ValueError:
+            raise ValidationError({'ids': ['Expected comma-separated recipe ids.']})
+        if not ids:
+            raise ValidationError({'ids': ['At least one recipe id is required.']})
+        if len(ids) > self.max_batch_size:
+            raise ValidationError({'ids': [f'At most {self.max_batch_size} recipes per batch.']})
+
+        payloads = self.detail_payloads(ids, fields)
+        return Response({
+            'results': [payloads[pk] for pk in ids if pk in payloads],
+            'missing': [pk for pk in ids if pk not in payloads],
+        })
+
+    def detail_payloads(self, ids, fields=None, using=None):
+        """
+        {id: detail payload} for those of `ids` that are the restaurant's, read in two queries.
+        """
+        queryset = self.get_queryset().filter(pk__in=ids)
+        if using is not None:
+            queryset = queryset.using(using)
+        if fastpath.enabled() or fields:
+            queryset = fastpath.detail_rows(queryset, fields)
+            rows = {row.pk: row for row in queryset}
+            if fastpath.wants_lines(fields, fastpath.DETAIL_FIELDS):
+                lines = fastpath.lines_by_recipe(list(rows), queryset.db)
+            else:
+                lines = {}
+            return {pk: fastpath.detail_data(row, lines.get(pk, ()), fields) for pk, row in rows.items()}
+        recipes = list(queryset.prefetch_related(ingredient_lines_prefetch()))
+        return {recipe.pk: data for recipe, data in zip(recipes, RecipeDetailSerializer(recipes, many=True).data)}
+
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        """
+        Delta sync: the recipes created, updated or deleted after ?since=<token>, as detail
+        payloads (taking ?fields= like retrieve) and deleted ids, with the token to ask with next.
+        Without ?since= only the current token is returned, to start from before a full download.
+        """
+        restaurant_id = self.get_restaurant_id_or_403()
+        # The log and the recipes come from the same database, so they agree with each other.
+        using = self.get_queryset().db
+        if 'since' not in request.query_params:
+            token = change_log.current_token(restaurant_id, using)
+            return Response({'changed': [], 'deleted': [], 'next': token, 'more': False})
+        fields = fastpath.requested_fields(request.query_params, fastpath.DETAIL_FIELDS)
+        try:
+            since = int(request.query_params['since'])
+            if since < 0:
+                raise ValueError(since)
+            changed, deleted, next_token, more = change_log.changes_since(restaurant_id, since, using)
+        except ValueError:
+            raise ValidationError({'since': ['Expected a token returned by this endpoint.']})
+        payloads = self.detail_payloads(changed, fields, using) if changed else {}
+        return Response({
+            'changed': [payloads[pk] for pk in changed if pk in payloads],
+            # Listed as changed but gone since: its tombstone is further along the log.
+            'deleted': deleted + [pk for pk in changed if pk not in payloads],
+            'next': next_token,
+            'more': more,
+        })
+
+    @action(detail=False, methods=['post'], url_path='shopping-list')
+    def shopping_list(self, request):
+        """
+        Total ingredient quantities for {"recipes": [{"id": 1, "multiplier": 2}, ...]},
+        per ingredient and unit, in one grouped query however many recipes are listed.
+        """
+        restaurant_id = self.get_restaurant_id_or_403()
+        serializer = ShoppingListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        multipliers = serializer.validated_data['recipes']
+        found = Recipe.objects.filter(restaurant_id=restaurant_id, pk__in=list(multipliers)).values_list('pk', flat=True)
+        missing = sorted(set(multipliers) - set(found))
+        if missing:
+            raise ValidationError({'recipes': [f"Unknown recipes: {', '.join(map(str, missing))}"]})
+        return Response({'recipes': len(multipliers), 'items': shopping.shopping_list(restaurant_id, multipliers)})
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status and progress of the restaurant's background jobs, newest first.
+    """
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        restaurant_id = get_restaurant_id(self.request)
+        if restaurant_id is None:
+            return Job.objects.none()
+        return Job.objects.filter(restaurant_id=restaurant_id).order_by('-created_at', '-id')
+
+
+class CacheStatsView(APIView):
+    """
+    Hit/miss counters for the recipe response cache in this process (admin only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache.stats.as_dict())
+
+
+class RecipeEventTicketView(APIView):
+    """
+    A short-lived ticket for opening the event stream: GET /recipes/events/?ticket=<ticket>.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if get_restaurant_id(request) is None:
+            raise PermissionDenied("Your account is not linked to a restaurant.")
+        return Response({'ticket': events.issue_ticket(request.user), 'expires_in': events.ticket_ttl()})
+
+
+class IngredientAutocompleteView(APIView):
+    """
+    Ingredients whose name, or a word in it, starts with ?q= (at most ?limit=, default 10).
+    Served from the in-process prefix index in autocomplete.py, not the database.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            limit = autocomplete.DEFAULT_LIMIT
+        limit = min(max(limit, 1), autocomplete.MAX_LIMIT)
+        matches = autocomplete.index.lookup(request.query_params.get('q', ''), limit)
+        return Response([{'id': pk, 'name': name} for pk, name in matches])
+
+
+class MetricsPermission(permissions.BasePermission):
+    """
+    Lets a scraper in with the RECIPES_METRICS_TOKEN bearer token; otherwise admins only.
+    """
+
+    def has_permission(self, request, view):
+        token = getattr(settings, 'RECIPES_METRICS_TOKEN', '')
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return True
+        return bool(request.user and request.user.is_staff)
+
+
+class MetricsView(APIView):
+    """
+    Request latency histograms and counters for this process, in Prometheus text format.
+    """
+    permission_classes = [MetricsPermission]
+
+    def perform_authentication(self, request):
+        # The scrape token is not a JWT; only fall back to normal authentication without it.
+        try:
+            request.user
+        except AuthenticationFailed:
+            request.user = AnonymousUser()
+
+    def get(self, request):
+        return HttpResponse(instrumentation.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
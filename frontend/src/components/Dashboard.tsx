@@ -1,4 +1,4 @@
-import React, { useState, useEffect, FC, useCallback } from 'react';
+import React, { useState, useEffect, FC, useCallback, useRef } from 'react';
 import { useAuth } from '../hooks/useAuth';
 import { api } from '../services/api';
 import { Recipe, RecipeSummary } from '../types';
@@ -46,6 +46,50 @@ export const Dashboard: FC<DashboardProps> = ({ setView, setSelectedRecipeId, se
     return () => clearTimeout(delayDebounceFn);
   }, [searchTerm, fetchRecipes]);
 
+  // Live updates: the backend pushes an event whenever a recipe of this restaurant changes,
+  // so edits made by other cooks show up without polling.
+  const searchTermRef = useRef(searchTerm);
+  searchTermRef.current = searchTerm;
+  useEffect(() => {
+    if (!token) return;
+    let source: EventSource | undefined;
+    let refresh: ReturnType<typeof setTimeout> | undefined;
+    let reconnect: ReturnType<typeof setTimeout> | undefined;
+    let closed = false;
+    const onChange = () => {
+      // Coalesce bursts (e.g. a bulk import) into one reload.
+      clearTimeout(refresh);
+      refresh = setTimeout(() => fetchRecipes(searchTermRef.current), 300);
+    };
+    // EventSource can't send an Authorization header, and a token in a URL ends up in logs, so
+    // each connection opens with a short-lived stream ticket instead. The browser's own reconnect
+    // would reuse a ticket that has expired by then: close on error and connect with a new one.
+    const connect = async (reconnecting: boolean) => {
+      try {
+        const { ticket } = await api.post<{ ticket: string }>('/api/recipes/events/ticket/', {}, token);
+        if (closed) return;
+        const stream = new EventSource(`${api.baseUrl}/api/recipes/events/?ticket=${encodeURIComponent(ticket)}`);
+        source = stream;
+        ['created', 'updated', 'deleted', 'resync'].forEach(type => stream.addEventListener(type, onChange));
+        stream.onerror = () => {
+          stream.close();
+          if (!closed) reconnect = setTimeout(() => connect(true), 3000);
+        };
+        // Writes made while disconnected were not pushed: reload once connected again.
+        stream.onopen = () => { if (reconnecting) onChange(); };
+      } catch (err) {
+        if (!closed) reconnect = setTimeout(() => connect(true), 3000);
+      }
+    };
+    connect(false);
+    return () => {
+      closed = true;
+      clearTimeout(refresh);
+      clearTimeout(reconnect);
+      source?.close();
+    };
+  }, [token, fetchRecipes]);
+
   const handleSelectRecipe = (id: number) => {
     setSelectedRecipeId(id);
     setView('detail');
@@ -1,7 +1,7 @@
-import React, { useState, FC } from 'react';
+import React, { useState, useEffect, FC } from 'react';
 import { useAuth } from '../hooks/useAuth';
 import { api } from '../services/api';
-import { Recipe, Ingredient } from '../types';
+import { Recipe, Ingredient, IngredientSuggestion } from '../types';
 
 interface RecipeFormProps {
   recipe: Recipe | null;
@@ -14,12 +14,29 @@ export const RecipeForm: FC<RecipeFormProps> = ({ recipe, onSave, onCancel }) =>
   const [instructions, setInstructions] = useState(recipe?.instructions || '');
   const [yieldAmount, setYieldAmount] = useState(recipe?.yield_amount || '');
   const [ingredients, setIngredients] = useState<Ingredient[]>(recipe?.ingredients || [{ name: '', quantity: '', unit: '' }]);
+  const [nameQuery, setNameQuery] = useState('');
+  const [suggestions, setSuggestions] = useState<string[]>([]);
   const { token } = useAuth();
 
+  // Suggest existing ingredient names while typing, so the same ingredient isn't created twice.
+  useEffect(() => {
+    if (!token || !nameQuery.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    const timer = setTimeout(() => {
+      api.get<IngredientSuggestion[]>(`/api/ingredients/autocomplete/?q=${encodeURIComponent(nameQuery)}`, token)
+        .then(results => setSuggestions(results.map(result => result.name)))
+        .catch(() => setSuggestions([]));
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [nameQuery, token]);
+
   const handleIngredientChange = (index: number, field: keyof Ingredient, value: string) => {
     const newIngredients = [...ingredients];
     newIngredients[index] = { ...newIngredients[index], [field]: value };
     setIngredients(newIngredients);
+    if (field === 'name') setNameQuery(value);
   };
 
   const addIngredient = () => setIngredients([...ingredients, { name: '', quantity: '', unit: '' }]);
@@ -52,11 +69,12 @@ export const RecipeForm: FC<RecipeFormProps> = ({ recipe, onSave, onCancel }) =>
             <h3 className="text-2xl font-bold mb-4">Ingredients</h3>
             {ingredients.map((ing, index) => (
                 <div key={index} className="grid grid-cols-1 md:grid-cols-4 gap-4 mb-4 items-center">
-                    <input type="text" value={ing.name} onChange={e => handleIngredientChange(index, 'name', e.target.value)} className="md:col-span-2 p-3 border rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500" placeholder="Ingredient Name" required />
+                    <input type="text" value={ing.name} onChange={e => handleIngredientChange(index, 'name', e.target.value)} className="md:col-span-2 p-3 border rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500" placeholder="Ingredient Name" list="ingredient-suggestions" autoComplete="off" required />
                     <input type="number" step="any" value={ing.quantity} onChange={e => handleIngredientChange(index, 'quantity', e.target.value)} className="p-3 border rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500" placeholder="Qty" required />
                     <div className="flex items-center"><input type="text" value={ing.unit} onChange={e => handleIngredientChange(index, 'unit', e.target.value)} className="p-3 border rounded-lg w-full focus:outline-none focus:ring-2 focus:ring-blue-500" placeholder="Unit" required /><button type="button" onClick={() => removeIngredient(index)} className="ml-2 text-red-500 hover:text-red-700 font-bold text-2xl">&times;</button></div>
                 </div>
             ))}
+            <datalist id="ingredient-suggestions">{suggestions.map(name => <option key={name} value={name} />)}</datalist>
             <button type="button" onClick={addIngredient} className="mb-6 bg-gray-200 hover:bg-gray-300 text-gray-800 font-bold py-2 px-4 rounded-lg">+ Add Ingredient</button>
             <div className="flex justify-end gap-4"><button type="button" onClick={onCancel} className="bg-gray-500 hover:bg-gray-600 text-white font-bold py-2 px-6 rounded-lg">Cancel</button><button type="submit" className="bg-blue-500 hover:bg-blue-700 text-white font-bold py-2 px-6 rounded-lg">Save Recipe</button></div>
         </form>
@@ -4,6 +4,11 @@ export interface Ingredient {
     unit: string;
   }
   
+  export interface IngredientSuggestion {
+    id: number;
+    name: string;
+  }
+
   export interface Recipe {
     id: number;
     title: string;